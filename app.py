@@ -3,13 +3,25 @@
 # =============
 # Importaciones
 # =============
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash
+from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, Response, stream_with_context
 from flask_login import LoginManager, UserMixin, login_required, login_user, logout_user, current_user
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
 import os  # Importado para acceder a variables de entorno.
-from datetime import datetime  # Importado para manejar fechas.
+import json
+import time
+import uuid
+import hashlib # Hash de los tokens de restablecimiento
+import hmac # Comparación en tiempo constante del token de /metrics
+import secrets # Nonce de los tokens de restablecimiento
+import threading
+import queue # Cola del escritor de auditoría
+import atexit
+from bisect import bisect_left # Búsqueda por prefijo en el catálogo de valores
+from concurrent.futures import ThreadPoolExecutor # Pool de trabajos en segundo plano
+from datetime import datetime, timedelta  # Importado para manejar fechas.
 import mH2 as moverHorarios02  # Importa el script que define la función para mover horarios.
+import metrics # Métricas de proceso expuestas en /metrics
 from flask_migrate import Migrate  # Import Flask-Migrate
 from dotenv import load_dotenv
 from itsdangerous import URLSafeTimedSerializer # Para generar tokens seguros
@@ -17,6 +29,8 @@ from flask_mail import Mail, Message # Importa Flask-Mail
 from email_validator import validate_email, EmailNotValidError # Importa la librería para validar el email
 from itsdangerous import URLSafeTimedSerializer # Para generar tokens seguros
 from flask_mail import Mail, Message # Importa Flask-Mail
+from sqlalchemy import delete, insert, or_, select, update # Consultas masivas para la copia local de Planes
+from sqlalchemy.exc import IntegrityError # Reversiones duplicadas
 
 # Cargar variables de entorno
 load_dotenv()
@@ -71,11 +85,16 @@ class User(UserMixin, db.Model):
         self.email = email
 
 class AuditLog(db.Model):
+    __table_args__ = (
+        db.Index('ix_audit_log_user_id_timestamp', 'user_id', 'timestamp'), # Historial de un usuario
+        db.Index('ix_audit_log_action', 'action'), # Búsquedas por tipo de acción
+    )
+
     id = db.Column(db.Integer, primary_key=True) # ID único del registro de auditoría
     timestamp = db.Column(db.DateTime, default=datetime.utcnow) # Fecha y hora de la acción
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False) # ID del usuario que realizó la acción (clave foránea a la tabla 'user')
     action = db.Column(db.String(200), nullable=False) # Descripción de la acción realizada
-    details = db.Column(db.Text) # Detalles adicionales sobre la acción (puedes ser JSON, texto, etc.)
+    details = db.Column(db.JSON) # Detalles estructurados de la acción (parámetros, contadores, errores)
 
     user = db.relationship('User', backref=db.backref('audit_logs', lazy=True)) # Relación con el modelo User para acceder al usuario que realizó la acción
 
@@ -86,6 +105,1229 @@ class AuditLog(db.Model):
 
         return f'<AuditLog {self.id} - User: {username} - Action: {self.action} - Timestamp: {self.timestamp}>'
 
+AUDIT_BATCH_SIZE = 50 # Registros de auditoría que se insertan juntos como máximo
+AUDIT_FLUSH_INTERVAL = 2.0 # Segundos máximos que un registro espera en la cola antes de escribirse
+
+class AuditWriter:
+    """
+    Escritor de auditoría en segundo plano: `record()` solo encola y un hilo inserta los
+    registros por lotes (un INSERT y un commit por lote) en lugar de un commit por acción.
+    El hilo se arranca con el primer registro, ya dentro del proceso worker.
+    """
+
+    def __init__(self, batch_size=AUDIT_BATCH_SIZE, flush_interval=AUDIT_FLUSH_INTERVAL):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock() # Permite a flush() esperar al lote que esté en curso
+
+    def record(self, user_id, action, details=None):
+        self._queue.put({'user_id': user_id, 'action': action, 'details': details, 'timestamp': datetime.utcnow()})
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+                self._thread.start()
+
+    def _take_batch(self, timeout):
+        try:
+            rows = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while len(rows) < self.batch_size:
+            try:
+                rows.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return rows
+
+    def _write(self, rows):
+        with self._write_lock, app.app_context():
+            try:
+                with metrics.phase('audit_commit'):
+                    db.session.execute(insert(AuditLog), rows)
+                    db.session.commit()
+            except Exception:
+                db.session.rollback()
+                # El lote no se reintenta para no bloquear la cola: queda al menos en el log
+                moverHorarios02.logger.exception(f"No se pudieron guardar {len(rows)} registros de auditoría: {rows}")
+
+    def _run(self):
+        while True:
+            rows = self._take_batch(self.flush_interval)
+            if rows:
+                self._write(rows)
+
+    def flush(self):
+        # Escribe lo pendiente en el hilo que llama (al salir del proceso)
+        while True:
+            rows = self._take_batch(0.01)
+            if not rows:
+                break
+            self._write(rows)
+        with self._write_lock:
+            pass
+
+audit_writer = AuditWriter()
+atexit.register(audit_writer.flush)
+
+# ==================================================
+# Copia local de la base de datos de Planes (Notion)
+# ==================================================
+# Propiedades de Notion que se copian para poder filtrar localmente (separadas por comas)
+MIRROR_PROPERTIES = tuple(
+    name.strip() for name in os.environ.get(
+        'PLAN_MIRROR_PROPERTIES', 'ID del proyecto,Cliente,Usuario,For - Código de departamento'
+    ).split(',') if name.strip()
+)
+MIRROR_ENABLED = os.environ.get('PLAN_MIRROR_ENABLED', '1') == '1'
+MIRROR_BATCH_SIZE = 500
+# Horas tras las que la copia se reconstruye entera: la sincronización incremental no ve
+# las páginas archivadas o borradas en Notion
+MIRROR_FULL_SYNC_HOURS = float(os.environ.get('PLAN_MIRROR_FULL_SYNC_HOURS', '6'))
+# Las peticiones web no sincronizan: un hilo mantiene la copia al día cada MIRROR_SYNC_INTERVAL
+# segundos y, si la copia supera MIRROR_MAX_AGE, la petición consulta Notion directamente
+MIRROR_SYNC_INTERVAL = int(os.environ.get('PLAN_MIRROR_SYNC_INTERVAL', '60'))
+MIRROR_MAX_AGE = int(os.environ.get('PLAN_MIRROR_MAX_AGE', '300'))
+# Segundos que un proceso retiene la sincronización; pasado este plazo se da por caído
+# y otro worker puede reclamarla
+MIRROR_SYNC_LEASE = int(os.environ.get('PLAN_MIRROR_SYNC_LEASE', '1800'))
+
+class PlanMirrorPage(db.Model):
+    page_id = db.Column(db.String(36), primary_key=True) # ID de la página en Notion
+    start = db.Column(db.String(40)) # Fecha de inicio tal como la guarda Notion (ISO 8601)
+    end = db.Column(db.String(40)) # Fecha de fin tal como la guarda Notion (ISO 8601)
+    start_local = db.Column(db.DateTime, index=True) # Inicio en hora local sin zona, para el corte por fecha
+    last_edited_time = db.Column(db.String(40)) # last_edited_time de Notion
+
+class PlanMirrorValue(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    page_id = db.Column(db.String(36), db.ForeignKey('plan_mirror_page.page_id', ondelete='CASCADE'), nullable=False, index=True)
+    name = db.Column(db.String(200), nullable=False) # Nombre de la propiedad de Notion
+    value = db.Column(db.String(500), nullable=False) # Valor como texto (una fila por opción en multi_select/people)
+
+    __table_args__ = (db.Index('ix_plan_mirror_value_name_value', 'name', 'value'),)
+
+class PlanMirrorState(db.Model):
+    database_id = db.Column(db.String(36), primary_key=True)
+    watermark = db.Column(db.String(40)) # Mayor last_edited_time sincronizado
+    synced_at = db.Column(db.DateTime) # Momento de la última sincronización
+    full_synced_at = db.Column(db.DateTime) # Momento de la última reconstrucción completa
+    sync_lease_until = db.Column(db.DateTime) # Sincronización en curso en algún worker hasta esta hora
+
+def _mirror_text(value):
+    # Representación textual única para valores de Notion y valores escritos en el formulario
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def _mirror_rows(records):
+    page_rows, value_rows = [], []
+    for record in records:
+        start_local = None
+        if record.start:
+            try:
+                start_local = moverHorarios02.parse_notion_datetime(record.start)
+            except ValueError:
+                pass
+        page_rows.append({
+            'page_id': record.id,
+            'start': record.start,
+            'end': record.end,
+            'start_local': start_local,
+            'last_edited_time': record.last_edited_time,
+        })
+        for name, value in zip(record.keys, record.values):
+            values = value if isinstance(value, tuple) else (value,)
+            for item in values:
+                if item is not None and item != '':
+                    value_rows.append({'page_id': record.id, 'name': name, 'value': _mirror_text(item)[:500]})
+    return page_rows, value_rows
+
+def _upsert_mirror_batch(records):
+    # Borrar e insertar en bloque es portable entre SQLite y Postgres y cuesta dos sentencias por lote
+    records = list({record.id: record for record in records}.values())
+    ids = [record.id for record in records]
+    page_rows, value_rows = _mirror_rows(records)
+    db.session.execute(delete(PlanMirrorValue).where(PlanMirrorValue.page_id.in_(ids)))
+    db.session.execute(delete(PlanMirrorPage).where(PlanMirrorPage.page_id.in_(ids)))
+    db.session.execute(insert(PlanMirrorPage), page_rows)
+    if value_rows:
+        db.session.execute(insert(PlanMirrorValue), value_rows)
+
+def sync_plan_mirror(full=False, min_age=0):
+    """
+    Sincroniza la copia local de Planes. Incremental por defecto: solo pide a Notion las
+    páginas editadas desde la última marca de agua. Cada MIRROR_FULL_SYNC_HOURS se
+    reconstruye entera para descartar las páginas archivadas o borradas. Devuelve el
+    número de páginas copiadas, o None si otro proceso está sincronizando o la copia se
+    sincronizó hace menos de min_age segundos.
+    """
+    if not _claim_mirror_sync(min_age):
+        return None
+    try:
+        return _sync_plan_mirror(full)
+    except Exception:
+        _release_mirror_sync()
+        raise
+
+def _claim_mirror_sync(min_age):
+    # Todos los workers sincronizan: solo uno a la vez, reclamado con una actualización condicional
+    if db.session.get(PlanMirrorState, moverHorarios02.DATABASE_ID) is None:
+        db.session.add(PlanMirrorState(database_id=moverHorarios02.DATABASE_ID))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Otro worker creó la fila a la vez
+            db.session.rollback()
+    now = datetime.utcnow()
+    conditions = [
+        PlanMirrorState.database_id == moverHorarios02.DATABASE_ID,
+        or_(PlanMirrorState.sync_lease_until.is_(None), PlanMirrorState.sync_lease_until < now),
+    ]
+    if min_age:
+        conditions.append(or_(PlanMirrorState.synced_at.is_(None),
+                              PlanMirrorState.synced_at < now - timedelta(seconds=min_age)))
+    claimed = db.session.execute(
+        update(PlanMirrorState)
+        .where(*conditions)
+        .values(sync_lease_until=now + timedelta(seconds=MIRROR_SYNC_LEASE))
+    ).rowcount
+    db.session.commit()
+    return bool(claimed)
+
+def _release_mirror_sync():
+    db.session.execute(
+        update(PlanMirrorState)
+        .where(PlanMirrorState.database_id == moverHorarios02.DATABASE_ID)
+        .values(sync_lease_until=None)
+    )
+    db.session.commit()
+
+def _sync_plan_mirror(full):
+    state = db.session.get(PlanMirrorState, moverHorarios02.DATABASE_ID)
+    if state.full_synced_at is None or datetime.utcnow() - state.full_synced_at >= timedelta(hours=MIRROR_FULL_SYNC_HOURS):
+        full = True
+    since = None if full else state.watermark
+    watermark = since
+    synced = 0
+    batch = []
+
+    try:
+        if full:
+            # Las páginas archivadas en Notion no aparecen en la consulta: se parte de cero
+            db.session.execute(delete(PlanMirrorValue))
+            db.session.execute(delete(PlanMirrorPage))
+        for record in moverHorarios02.iter_pages_edited_since(since, MIRROR_PROPERTIES):
+            if not record.id:
+                continue
+            batch.append(record)
+            if record.last_edited_time and (watermark is None or record.last_edited_time > watermark):
+                watermark = record.last_edited_time
+            if len(batch) >= MIRROR_BATCH_SIZE:
+                _upsert_mirror_batch(batch)
+                synced += len(batch)
+                batch = []
+        if batch:
+            _upsert_mirror_batch(batch)
+            synced += len(batch)
+        state.watermark = watermark
+        state.synced_at = datetime.utcnow()
+        if full:
+            state.full_synced_at = state.synced_at
+        state.sync_lease_until = None
+        db.session.commit()
+    except Exception:
+        # La marca de agua solo avanza si se copió todo el intervalo
+        db.session.rollback()
+        raise
+
+    moverHorarios02.logger.info(f"Copia local de Planes sincronizada: {synced} páginas ({'completa' if full else 'incremental'})")
+    return synced
+
+def _escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def select_pages_from_mirror(start_date, property_filters=None):
+    """
+    Selecciona localmente las páginas a mover con la misma semántica que los filtros de Notion.
+    Devuelve None si algún filtro usa una propiedad que no está en la copia local.
+    """
+    property_filters = property_filters or {}
+    # Las expresiones compuestas (OR, rangos, negaciones) se compilan a una sola consulta de Notion
+    if moverHorarios02.is_filter_expression(property_filters):
+        return None
+    if any(name not in MIRROR_PROPERTIES for name in property_filters):
+        return None
+
+    db_properties = moverHorarios02.get_database_properties()
+    query = select(PlanMirrorPage).where(PlanMirrorPage.start_local >= start_date)
+    for name, value in property_filters.items():
+        prop_type = db_properties.get(name, {}).get('type')
+        if prop_type in ('title', 'rich_text', 'formula'):
+            # Notion aplica "contains" sin distinguir mayúsculas; % y _ del valor son literales
+            condition = PlanMirrorValue.value.ilike(f'%{_escape_like(str(value))}%', escape='\\')
+        elif prop_type == 'number':
+            try:
+                condition = PlanMirrorValue.value == _mirror_text(float(value))
+            except (TypeError, ValueError):
+                return None
+        elif prop_type == 'checkbox':
+            condition = PlanMirrorValue.value == str(value).lower()
+        elif prop_type in ('select', 'status', 'multi_select', 'people'):
+            condition = PlanMirrorValue.value == _mirror_text(value)
+        else:
+            return None
+        query = query.where(PlanMirrorPage.page_id.in_(
+            select(PlanMirrorValue.page_id).where(PlanMirrorValue.name == name, condition)
+        ))
+    query = query.order_by(PlanMirrorPage.start_local)
+
+    return [
+        moverHorarios02.ScheduledPage(row.page_id, row.start, row.end, row.last_edited_time)
+        for row in db.session.execute(query).scalars()
+    ]
+
+class MirrorSyncer:
+    """
+    Hilo que sincroniza la copia local de Planes cada MIRROR_SYNC_INTERVAL segundos.
+    Se arranca con la primera petición que la usa, ya dentro del proceso worker.
+    """
+
+    def __init__(self, interval=MIRROR_SYNC_INTERVAL):
+        self.interval = interval
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='plan-mirror-sync', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            with app.app_context():
+                try:
+                    # Cada worker tiene su hilo, pero solo sincroniza si nadie lo hizo en el intervalo
+                    sync_plan_mirror(min_age=self.interval)
+                except Exception:
+                    db.session.rollback()
+                    moverHorarios02.logger.exception("Error al sincronizar la copia local de Planes")
+            time.sleep(self.interval)
+
+mirror_syncer = MirrorSyncer()
+
+def mirror_is_fresh():
+    state = db.session.get(PlanMirrorState, moverHorarios02.DATABASE_ID)
+    if state is None or state.synced_at is None or datetime.utcnow() - state.synced_at > timedelta(seconds=MIRROR_MAX_AGE):
+        return False
+    # Los PATCH de un ajuste no pasan por la copia: un trabajo vivo o terminado tras la última
+    # sincronización la deja desfasada hasta la siguiente (un trabajo caído deja de contar
+    # cuando la sincronización supera su último latido)
+    moved = db.session.execute(
+        select(AdjustmentJob.id).where(or_(
+            AdjustmentJob.finished_at > state.synced_at,
+            (AdjustmentJob.state == 'running')
+            & (AdjustmentJob.heartbeat_at > state.synced_at - timedelta(seconds=JOB_HEARTBEAT_INTERVAL))
+        )).limit(1)
+    ).first()
+    return moved is None
+
+def select_target_pages(start_date, property_filters=None, sync=True):
+    """
+    Selecciona las páginas a mover en la copia local; None si hay que consultar Notion directamente.
+    Con sync=True (trabajos en segundo plano) sincroniza antes; con sync=False (peticiones web)
+    no espera a Notion y solo usa la copia si mirror_syncer la mantiene reciente.
+    """
+    if not MIRROR_ENABLED:
+        return None
+    try:
+        if sync:
+            # Si otro worker está sincronizando, la copia solo sirve si ya está al día
+            if sync_plan_mirror() is None and not mirror_is_fresh():
+                return None
+        else:
+            mirror_syncer.start()
+            if not mirror_is_fresh():
+                return None
+        return select_pages_from_mirror(start_date, property_filters)
+    except Exception as e:
+        db.session.rollback()
+        moverHorarios02.logger.error(f"No se pudo usar la copia local de Planes, se consulta Notion: {e}")
+        return None
+
+# ===================================================
+# Trabajos en segundo plano (ajustes de horarios)
+# ===================================================
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2')) # Ajustes que se ejecutan a la vez por proceso
+JOB_PROGRESS_INTERVAL = 1.0 # Segundos mínimos entre escrituras de progreso en la base de datos
+JOB_STALE_AFTER = 120 # Segundos sin latido tras los que un trabajo 'running' se considera interrumpido
+JOB_HEARTBEAT_INTERVAL = 30 # Segundos entre latidos de un trabajo en ejecución (muy por debajo de JOB_STALE_AFTER)
+JOB_FINAL_STATES = ('succeeded', 'failed', 'interrupted') # Estados tras los que el stream de eventos se cierra
+JOURNAL_FLUSH_SIZE = 50 # Resultados de páginas que se acumulan antes de escribirlos en el diario
+MAX_BATCH_OPERATIONS = 20 # Operaciones admitidas en un solo lote de /run_batch
+
+JOB_EVENTS_KEEPALIVE = 15 # Segundos sin eventos tras los que el stream SSE envía un comentario
+# Segundos que se mantiene abierto un stream SSE, por debajo del timeout de worker de gunicorn (30 s):
+# al cerrarse, EventSource reconecta solo enviando Last-Event-ID.
+# Cada stream abierto ocupa un hilo del worker. Con /jobs/<id>/events en uso, gunicorn debe
+# arrancar con workers de hilos o asíncronos:
+#     gunicorn --worker-class gthread --threads 8 app:app   (o --worker-class gevent)
+# Con workers síncronos, JOB_EVENTS_MAX_DURATION=0 reduce el stream a enviar el estado actual
+# y cerrar; el navegador vuelve a preguntar cada JOB_EVENTS_RETRY_MS sin bloquear el worker
+JOB_EVENTS_MAX_DURATION = int(os.environ.get('JOB_EVENTS_MAX_DURATION', '20'))
+JOB_EVENTS_RETRY_MS = 1000 # Espera que se indica al navegador antes de reconectar
+
+job_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix='adjust-job')
+
+class ProgressBroker:
+    """
+    Último evento de progreso de cada trabajo que se ejecuta en este proceso.
+    Los suscriptores SSE esperan en la condición en lugar de consultar la base de datos.
+    """
+
+    def __init__(self):
+        self._events = {} # job_id -> (secuencia, evento)
+        self._condition = threading.Condition()
+
+    def publish(self, job_id, event):
+        with self._condition:
+            seq = self._events.get(job_id, (0, None))[0] + 1
+            self._events[job_id] = (seq, event)
+            self._condition.notify_all()
+
+    def knows(self, job_id):
+        with self._condition:
+            return job_id in self._events
+
+    def wait(self, job_id, after_seq, timeout):
+        # Devuelve (0, None) en cuanto el trabajo se descarta: su estado final ya está en la
+        # base de datos y el suscriptor no debe esperar al siguiente keepalive
+        with self._condition:
+            self._condition.wait_for(
+                lambda: job_id not in self._events or self._events[job_id][0] > after_seq, timeout)
+            return self._events.get(job_id, (0, None))
+
+    def discard(self, job_id):
+        with self._condition:
+            self._events.pop(job_id, None)
+            self._condition.notify_all()
+
+progress_broker = ProgressBroker()
+
+class AdjustmentJob(db.Model):
+    id = db.Column(db.String(32), primary_key=True) # Identificador público del trabajo (uuid4 hex)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False) # Usuario que lanzó el trabajo
+    state = db.Column(db.String(20), nullable=False, default='queued', index=True) # queued, running, succeeded, failed
+    params = db.Column(db.JSON, nullable=False) # Horas, fecha de inicio y filtros recibidos
+    counters = db.Column(db.JSON) # Últimos contadores conocidos (total, updated, failed, skipped)
+    summary = db.Column(db.Text) # Resumen final devuelto por mH2
+    error = db.Column(db.Text) # Mensaje de error si el trabajo falló
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime) # Último latido del proceso que tiene el trabajo en cola o en ejecución
+    rollback_of = db.Column(db.String(32), db.ForeignKey('adjustment_job.id'), unique=True) # Trabajo que esta reversión deshace
+    pages = db.Column(db.JSON) # [id, start, end, last_edited_time] de una vista previa confirmada; reanudar no vuelve a seleccionar
+
+    def is_active(self):
+        if self.state not in ('queued', 'running'):
+            return False
+        # Un trabajo sin latido reciente quedó interrumpido (worker reiniciado o caído), también
+        # si aún estaba en la cola del pool de ese worker
+        last_seen = self.heartbeat_at or self.started_at or self.created_at
+        return last_seen is not None and (datetime.utcnow() - last_seen).total_seconds() < JOB_STALE_AFTER
+
+    def is_resumable(self):
+        # Se reanuda lo interrumpido o lo que terminó con páginas fallidas; nunca un trabajo vivo
+        if self.is_active():
+            return False
+        return self.state in ('failed', 'queued', 'running') or bool((self.counters or {}).get('failed'))
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'state': self.state,
+            'params': self.params,
+            'counters': self.counters or {},
+            'summary': self.summary,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'resumable': self.is_resumable(),
+            'rollback_of': self.rollback_of,
+        }
+
+    def to_event(self):
+        # Un trabajo en cola o 'running' sin latido se muestra como interrumpido para que el cliente deje de esperar
+        interrupted = self.state in ('queued', 'running') and not self.is_active()
+        return {
+            'state': 'interrupted' if interrupted else self.state,
+            'counters': self.counters or {},
+            'summary': self.summary,
+            'error': self.error,
+            'resumable': self.is_resumable(),
+            'rollback_of': self.rollback_of,
+        }
+
+class AdjustmentJournalEntry(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.String(32), db.ForeignKey('adjustment_job.id'), nullable=False) # Trabajo que movió la página
+    page_id = db.Column(db.String(36), nullable=False) # ID de la página en Notion
+    original_start = db.Column(db.String(40)) # Fechas antes del ajuste, tal como las guardaba Notion
+    original_end = db.Column(db.String(40))
+    applied_start = db.Column(db.String(40), nullable=False) # Fechas escritas por el ajuste
+    applied_end = db.Column(db.String(40))
+    status = db.Column(db.String(10), nullable=False, default='pending') # pending, updated, failed
+
+    __table_args__ = (db.UniqueConstraint('job_id', 'page_id', name='uq_adjustment_journal_job_page'),)
+
+class DbJournal:
+    """
+    Diario por página de un trabajo (interfaz `journal` de mH2.apply_planned_updates).
+    Cada lote se inserta como 'pending' antes de enviar sus PATCH y los resultados se
+    marcan en bloque cada JOURNAL_FLUSH_SIZE páginas. Una entrada 'pending' tras una
+    caída se reaplica a sus fechas absolutas, así que reanudar nunca desplaza dos veces.
+    En una reversión (`verify=True`) las entradas reanudadas vuelven a comprobar la fecha actual.
+    """
+
+    def __init__(self, job_id, flush_size=JOURNAL_FLUSH_SIZE, verify=False):
+        self.job_id = job_id
+        self.flush_size = flush_size
+        self.verify = verify
+        self._results = []
+        rows = db.session.execute(
+            select(AdjustmentJournalEntry.page_id, AdjustmentJournalEntry.status)
+            .where(AdjustmentJournalEntry.job_id == job_id)
+        ).all()
+        self._known = dict(rows) # page_id -> estado
+
+    def contains(self, page_id):
+        return page_id in self._known
+
+    def unfinished(self):
+        entries = db.session.execute(
+            select(AdjustmentJournalEntry)
+            .where(AdjustmentJournalEntry.job_id == self.job_id, AdjustmentJournalEntry.status != 'updated')
+        ).scalars().all()
+        for entry in entries:
+            yield moverHorarios02.PlannedUpdate(
+                entry.page_id, entry.original_start, entry.original_end,
+                datetime.fromisoformat(entry.applied_start),
+                datetime.fromisoformat(entry.applied_end) if entry.applied_end else None,
+                verify=self.verify
+            )
+
+    def begin(self, plans):
+        rows = [{
+            'job_id': self.job_id,
+            'page_id': plan.page_id,
+            'original_start': plan.original_start,
+            'original_end': plan.original_end,
+            'applied_start': plan.new_start.isoformat(),
+            'applied_end': plan.new_end.isoformat() if plan.new_end else None,
+            'status': 'pending',
+        } for plan in plans if plan.page_id not in self._known]
+        if rows:
+            with metrics.phase('journal_begin'):
+                db.session.execute(insert(AdjustmentJournalEntry), rows)
+                db.session.commit()
+            self._known.update((row['page_id'], 'pending') for row in rows)
+
+    def finish(self, plan, ok):
+        status = 'updated' if ok else 'failed'
+        self._known[plan.page_id] = status
+        self._results.append((plan.page_id, status))
+        if len(self._results) >= self.flush_size:
+            self.flush()
+
+    def flush(self):
+        if not self._results:
+            return
+        by_status = {}
+        for page_id, status in self._results:
+            by_status.setdefault(status, []).append(page_id)
+        with metrics.phase('journal_flush'):
+            for status, page_ids in by_status.items():
+                db.session.execute(
+                    update(AdjustmentJournalEntry)
+                    .where(AdjustmentJournalEntry.job_id == self.job_id, AdjustmentJournalEntry.page_id.in_(page_ids))
+                    .values(status=status)
+                )
+            db.session.commit()
+        self._results = []
+
+class JobHeartbeats:
+    """
+    Latido de los trabajos que este proceso tiene en cola o en ejecución: un hilo renueva
+    su heartbeat_at cada JOB_HEARTBEAT_INTERVAL segundos, también mientras esperan turno en
+    el pool o sincronizan la copia local, fases que no emiten progreso. Si el proceso
+    muere el latido se detiene y el trabajo pasa a considerarse interrumpido.
+    """
+
+    def __init__(self, interval=JOB_HEARTBEAT_INTERVAL):
+        self.interval = interval
+        self._jobs = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def add(self, job_id):
+        with self._lock:
+            self._jobs.add(job_id)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='job-heartbeat', daemon=True)
+                self._thread.start()
+
+    def discard(self, job_id):
+        with self._lock:
+            self._jobs.discard(job_id)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                job_ids = list(self._jobs)
+            if not job_ids:
+                continue
+            with app.app_context():
+                try:
+                    db.session.execute(
+                        update(AdjustmentJob)
+                        .where(AdjustmentJob.id.in_(job_ids), AdjustmentJob.state.in_(('queued', 'running')))
+                        .values(heartbeat_at=datetime.utcnow())
+                    )
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    moverHorarios02.logger.exception("No se pudo registrar el latido de los trabajos en curso")
+
+job_heartbeats = JobHeartbeats()
+
+def _submit_job(job_id, *args):
+    # El latido empieza al encolar: un trabajo que espera turno en el pool sigue vivo
+    job_heartbeats.add(job_id)
+    job_executor.submit(_run_adjustment_job, job_id, *args)
+
+def _run_adjustment_job(job_id, resume=False):
+    # Se ejecuta en un hilo del pool: necesita su propio contexto de aplicación y sesión
+    with app.app_context():
+        job = db.session.get(AdjustmentJob, job_id)
+        job.state = 'running'
+        job.started_at = job.heartbeat_at = datetime.utcnow()
+        job.finished_at = None
+        job.error = None
+        db.session.commit()
+        progress_broker.publish(job_id, {'state': 'running', 'counters': {}})
+
+        params = job.params
+        last_write = 0.0
+        kind = 'rollback' if job.rollback_of else 'batch' if 'operations' in params else 'shift'
+        run_started = time.perf_counter()
+        metrics.RUNS_ACTIVE.inc()
+
+        def on_progress(counters):
+            # Los contadores se guardan siempre; el commit se limita a uno por intervalo
+            # (el latido lo escribe job_heartbeats, con o sin progreso)
+            nonlocal last_write
+            job.counters = dict(counters)
+            progress_broker.publish(job_id, {'state': 'running', 'counters': job.counters})
+            now = time.monotonic()
+            if now - last_write >= JOB_PROGRESS_INTERVAL:
+                last_write = now
+                db.session.commit()
+
+        try:
+            if job.rollback_of:
+                result_dict = moverHorarios02.rollback_date_adjustment(
+                    rollback_entries(job.rollback_of),
+                    on_progress=on_progress,
+                    journal=DbJournal(job_id, verify=True),
+                    resume=resume
+                )
+            elif 'operations' in params:
+                operations = [dict(
+                    operation,
+                    pages=select_target_pages(datetime.strptime(operation['start_date'], "%Y-%m-%d"), operation['property_filters'])
+                ) for operation in params['operations']]
+                result_dict = moverHorarios02.adjust_dates_batch_api(
+                    operations,
+                    on_progress=on_progress,
+                    journal=DbJournal(job_id),
+                    resume=resume
+                )
+            else:
+                start_date = datetime.strptime(params['start_date'], "%Y-%m-%d")
+                # Las páginas de una vista previa se calcularon sobre fechas leídas antes: cada
+                # PATCH comprueba que la página no cambió desde entonces
+                confirmed = job.pages is not None
+                if confirmed:
+                    target_pages = [moverHorarios02.ScheduledPage(*page) for page in job.pages]
+                else:
+                    target_pages = select_target_pages(start_date, params['property_filters'])
+                result_dict = moverHorarios02.adjust_dates_api(
+                    params['hours'], params['start_date'],
+                    property_filters=params['property_filters'],
+                    pages=target_pages,
+                    on_progress=on_progress,
+                    journal=DbJournal(job_id, verify=confirmed),
+                    resume=resume,
+                    verify=confirmed
+                )
+            if result_dict.get('success'):
+                job.state = 'succeeded'
+                job.summary = result_dict.get('message')
+            else:
+                job.state = 'failed'
+                job.error = result_dict.get('error')
+        except Exception as e:
+            db.session.rollback()
+            moverHorarios02.logger.exception(f"Error en el trabajo de ajuste {job_id}")
+            job.state = 'failed'
+            job.error = str(e)
+            result_dict = {'success': False, 'error': str(e)}
+
+        job_heartbeats.discard(job_id)
+        job.finished_at = datetime.utcnow()
+        metrics.RUNS_ACTIVE.dec()
+        metrics.RUN_SECONDS.observe(time.perf_counter() - run_started, kind=kind, state=job.state)
+
+        # Contadores en lugar del resumen en texto: el detalle completo está en el trabajo
+        details = {
+            'job_id': job_id,
+            'state': job.state,
+            'counters': job.counters or {},
+            'error': result_dict.get('error'),
+        }
+        if job.rollback_of:
+            action, details['rollback_of'] = 'Reversión de Ajuste', job.rollback_of
+        elif 'operations' in params:
+            action, details['operations'] = 'Ajuste de Horarios en Lote', params['operations']
+        else:
+            action = 'Ajuste de Horarios'
+            details.update(hours=params['hours'], start_date=params['start_date'], property_filters=params['property_filters'])
+        user_id = job.user_id
+        db.session.commit()
+        audit_writer.record(user_id, action, details)
+        progress_broker.publish(job_id, job.to_event())
+        progress_broker.discard(job_id)
+
+def enqueue_adjustment_job(user_id, params, pages=None):
+    # `pages`: filas [id, start, end, last_edited_time] de una vista previa confirmada. Se guardan
+    # en el trabajo para que reanudarlo mueva exactamente esas páginas
+    job = AdjustmentJob(id=uuid.uuid4().hex, user_id=user_id, state='queued', params=params, pages=pages)
+    db.session.add(job)
+    db.session.commit()
+    _submit_job(job.id)
+    return job
+
+def rollback_entries(job_id):
+    # Solo las páginas que el ajuste pudo cambiar: las 'failed' nunca se movieron y las
+    # 'pending' (ajuste interrumpido) se restauran igualmente porque la fecha original es absoluta
+    return db.session.execute(
+        select(
+            AdjustmentJournalEntry.page_id,
+            AdjustmentJournalEntry.original_start, AdjustmentJournalEntry.original_end,
+            AdjustmentJournalEntry.applied_start, AdjustmentJournalEntry.applied_end
+        )
+        .where(AdjustmentJournalEntry.job_id == job_id, AdjustmentJournalEntry.status != 'failed')
+        .order_by(AdjustmentJournalEntry.id)
+    ).all()
+
+def enqueue_rollback_job(user_id, source):
+    job = AdjustmentJob(id=uuid.uuid4().hex, user_id=user_id, state='queued', params=source.params, rollback_of=source.id)
+    db.session.add(job)
+    db.session.commit()
+    _submit_job(job.id)
+    return job
+
+def resume_adjustment_job(job):
+    # Solo un worker puede reanudar: la actualización condicional falla si otro ya lo reclamó
+    claimed = db.session.execute(
+        update(AdjustmentJob)
+        .where(
+            AdjustmentJob.id == job.id,
+            AdjustmentJob.state == job.state,
+            # Un trabajo que se quedó en cola sin llegar a latir tiene heartbeat_at nulo
+            AdjustmentJob.heartbeat_at.is_(None) if job.heartbeat_at is None else AdjustmentJob.heartbeat_at == job.heartbeat_at
+        )
+        .values(state='queued', heartbeat_at=datetime.utcnow())
+    ).rowcount
+    db.session.commit()
+    if claimed:
+        _submit_job(job.id, True)
+    return bool(claimed)
+
+def _adjustment_params_from_form(form):
+    # Devuelve (params, error) a partir del formulario de ajuste
+    try:
+        hours_to_adjust = int(form.get("hours"))  # Nombre más descriptivo para la variable
+    except (TypeError, ValueError):
+        return None, "Debes indicar un número de horas válido"
+
+    # Verificar si el checkbox 'move_backward' está marcado
+    move_backward = form.get("move_backward") == 'on' # Devuelve True si está marcado, False si no
+
+    # Ajustar las horas para restar si el checkbox está marcado
+    hours = hours_to_adjust if not move_backward else - hours_to_adjust
+
+    start_date_str = form.get("start_date")
+    if not start_date_str:
+        return None, "Debes seleccionar una fecha"
+    try:
+        datetime.strptime(start_date_str, "%Y-%m-%d")
+    except ValueError:
+        return None, "Formato de fecha inválido"
+
+    # Recoger los filtros del formulario, solo si se proporcionaron valores
+    property_filters = {}
+    for index in (1, 2):
+        property_name = form.get(f"property_name_{index}")
+        property_value = form.get(f"property_value_{index}")
+        if property_name and property_value:
+            property_filters[property_name] = property_value
+
+    # Una expresión de filtro (JSON con grupos and/or) sustituye a los pares propiedad-valor
+    filter_expression = (form.get("filter_expression") or "").strip()
+    if filter_expression:
+        try:
+            property_filters = _filter_expression_from_value(json.loads(filter_expression))
+        except ValueError as e:
+            return None, f"Expresión de filtro inválida: {e}"
+
+    return {
+        'hours': hours,
+        'start_date': start_date_str,
+        'property_filters': property_filters,
+    }, None
+
+def _filter_expression_from_value(value):
+    # Valida la estructura de la expresión; las propiedades se comprueban contra el esquema al ejecutar
+    if not moverHorarios02.is_filter_expression(value):
+        raise ValueError('se esperaba un grupo {"and": [...]} / {"or": [...]} o una condición con "property" y "op"')
+    return moverHorarios02.normalize_filter_expression(value)
+
+def _batch_operations_from_json(payload):
+    # Devuelve (operaciones, error) a partir del cuerpo JSON de /run_batch
+    operations = payload.get('operations') if isinstance(payload, dict) else None
+    if not isinstance(operations, list) or not operations:
+        return None, "Debes enviar una lista de operaciones"
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        return None, f"Un lote admite como máximo {MAX_BATCH_OPERATIONS} operaciones"
+
+    validated = []
+    for position, operation in enumerate(operations, start=1):
+        if not isinstance(operation, dict):
+            return None, f"Operación {position}: formato inválido"
+        hours = operation.get('hours')
+        if not isinstance(hours, int) or isinstance(hours, bool):
+            return None, f"Operación {position}: debes indicar un número de horas válido"
+        start_date_str = operation.get('start_date')
+        try:
+            datetime.strptime(start_date_str or '', "%Y-%m-%d")
+        except (TypeError, ValueError):
+            return None, f"Operación {position}: formato de fecha inválido"
+        property_filters = operation.get('property_filters') or {}
+        if moverHorarios02.is_filter_expression(property_filters):
+            try:
+                property_filters = _filter_expression_from_value(property_filters)
+            except ValueError as e:
+                return None, f"Operación {position}: expresión de filtro inválida: {e}"
+        elif isinstance(property_filters, dict) and all(isinstance(value, str) for value in property_filters.values()):
+            property_filters = {name: value for name, value in property_filters.items() if value}
+        else:
+            return None, f"Operación {position}: los filtros deben ser pares propiedad-valor o una expresión"
+        validated.append({
+            'hours': hours,
+            'start_date': start_date_str,
+            'property_filters': property_filters,
+        })
+    return validated, None
+
+# ==========================================
+# Vista previa (simulación) de ajustes
+# ==========================================
+PREVIEW_TTL = int(os.environ.get('PREVIEW_TTL', '600')) # Segundos que se guarda una vista previa para confirmarla
+PREVIEW_PAGE_SIZE = 50
+
+class AdjustmentPreview(db.Model):
+    # En la base de datos y no en memoria: la confirmación puede llegar a otro worker
+    id = db.Column(db.String(32), primary_key=True) # uuid4().hex enviado al navegador
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    params = db.Column(db.JSON, nullable=False) # Parámetros validados del ajuste
+    pages = db.Column(db.JSON, nullable=False) # [id, start, end, last_edited_time] de cada página seleccionada
+    rows = db.Column(db.JSON, nullable=False) # Filas mostradas (fechas actuales y nuevas)
+    skipped = db.Column(db.Integer, default=0)
+    errors = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True) # Índice para la limpieza
+
+def save_preview(user_id, params, preview):
+    now = datetime.utcnow()
+    # Las vistas previas caducadas se borran al crear otra: no hace falta un hilo aparte
+    db.session.execute(delete(AdjustmentPreview).where(AdjustmentPreview.expires_at <= now))
+    entry = AdjustmentPreview(
+        id=uuid.uuid4().hex,
+        user_id=user_id,
+        params=params,
+        pages=[[page.id, page.start, page.end, page.last_edited_time] for page in preview['pages']],
+        rows=preview['rows'],
+        skipped=preview['skipped'],
+        errors=preview['errors'],
+        created_at=now,
+        expires_at=now + timedelta(seconds=PREVIEW_TTL)
+    )
+    db.session.add(entry)
+    db.session.commit()
+    return entry
+
+def find_preview(preview_id, user_id):
+    # None si no existe, es de otro usuario o caducó
+    entry = db.session.get(AdjustmentPreview, preview_id)
+    if entry is None or entry.user_id != user_id or entry.expires_at <= datetime.utcnow():
+        return None
+    return entry
+
+def claim_preview(preview_id, user_id):
+    # Borrado condicional: de dos confirmaciones simultáneas solo una encola el ajuste
+    entry = find_preview(preview_id, user_id)
+    if entry is None:
+        return None
+    claimed = db.session.execute(
+        delete(AdjustmentPreview).where(AdjustmentPreview.id == preview_id, AdjustmentPreview.user_id == user_id)
+    ).rowcount == 1
+    db.session.commit()
+    return entry if claimed else None
+
+def _preview_page(preview, page, page_size):
+    rows = preview.rows
+    page_size = max(1, min(page_size, 500))
+    pages_count = max(1, -(-len(rows) // page_size))
+    page = max(1, min(page, pages_count))
+    return {
+        'preview_id': preview.id,
+        'params': preview.params,
+        'total': len(rows),
+        'skipped': preview.skipped,
+        'errors': preview.errors,
+        'page': page,
+        'page_size': page_size,
+        'pages': pages_count,
+        'rows': rows[(page - 1) * page_size:page * page_size],
+    }
+
+# ==========================================
+# Catálogo de propiedades y valores (autocompletado)
+# ==========================================
+CATALOG_TTL = int(os.environ.get('PROPERTY_CATALOG_TTL', '300')) # Segundos tras los que el índice se reconstruye en segundo plano
+CATALOG_TYPES = ('select', 'multi_select', 'status', 'title', 'rich_text') # Tipos con autocompletado
+CATALOG_LIMIT = 20
+
+class ValueCatalog:
+    """
+    Valores distintos por propiedad, ordenados sin distinguir mayúsculas: una búsqueda
+    por prefijo es un bisect más la lectura de los resultados, sin tocar la base de datos.
+    """
+
+    def __init__(self, values_by_property):
+        self._index = {
+            name: sorted({(value.casefold(), value) for value in values})
+            for name, values in values_by_property.items()
+        }
+
+    def complete(self, name, prefix='', limit=CATALOG_LIMIT):
+        entries = self._index.get(name, [])
+        key = prefix.casefold()
+        position = bisect_left(entries, (key,))
+        matches = []
+        for folded, value in entries[position:position + limit]:
+            if not folded.startswith(key):
+                break
+            matches.append(value)
+        return matches
+
+def build_value_catalog():
+    # Opciones del esquema (select/status) más los valores reales de la copia local de Planes.
+    # La copia se lee tal cual: la mantiene al día mirror_syncer, nunca esta petición
+    properties = moverHorarios02.list_available_properties()
+    types = {prop['name']: prop['type'] for prop in properties}
+    values = {}
+    for prop in properties:
+        if prop['type'] in CATALOG_TYPES and prop.get('options'):
+            values.setdefault(prop['name'], set()).update(prop['options'])
+
+    if MIRROR_ENABLED:
+        mirror_syncer.start()
+        try:
+            names = [name for name in MIRROR_PROPERTIES if types.get(name) in CATALOG_TYPES]
+            rows = db.session.execute(
+                select(PlanMirrorValue.name, PlanMirrorValue.value)
+                .where(PlanMirrorValue.name.in_(names))
+                .distinct()
+            ).all()
+            for name, value in rows:
+                values.setdefault(name, set()).add(value)
+        except Exception as e:
+            moverHorarios02.logger.error(f"No se pudieron leer los valores de la copia local de Planes: {e}")
+            db.session.rollback()
+
+    return ValueCatalog(values)
+
+class CatalogHolder:
+    """
+    Conserva el último índice de valores. Pasados CATALOG_TTL segundos se sigue sirviendo
+    el índice anterior mientras un hilo lo reconstruye; solo la primera petición del
+    proceso espera a que se construya.
+    """
+
+    def __init__(self, ttl=CATALOG_TTL):
+        self.ttl = ttl
+        self._catalog = None
+        self._built_at = 0.0
+        self._refreshing = False
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            catalog = self._catalog
+            if catalog is not None and not self._refreshing and time.monotonic() - self._built_at >= self.ttl:
+                self._refreshing = True
+                threading.Thread(target=self._refresh, name='value-catalog', daemon=True).start()
+        if catalog is not None:
+            return catalog
+        # Un solo hilo construye el primer índice; el resto espera y reutiliza el resultado
+        with self._build_lock:
+            if self._catalog is None:
+                self._store(build_value_catalog())
+            return self._catalog
+
+    def _store(self, catalog):
+        with self._lock:
+            self._catalog = catalog
+            self._built_at = time.monotonic()
+
+    def _refresh(self):
+        with app.app_context():
+            try:
+                self._store(build_value_catalog())
+            except Exception:
+                moverHorarios02.logger.exception("Error al reconstruir el catálogo de valores")
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+value_catalog = CatalogHolder()
+
+def get_value_catalog():
+    return value_catalog.get()
+
+# ==========================================
+# Creación idempotente de proyectos
+# ==========================================
+PROJECT_CREATION_STALE = 300 # Segundos tras los que un intento sin terminar se puede retomar
+
+class ProjectCreation(db.Model):
+    key = db.Column(db.String(64), primary_key=True) # Clave de idempotencia enviada por el formulario
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    nombre_proyecto = db.Column(db.String(200), nullable=False)
+    num_partidas = db.Column(db.Integer, nullable=False)
+    proyecto_id = db.Column(db.String(36)) # Página del proyecto en Notion, guardada en cuanto se conoce
+    state = db.Column(db.String(20), nullable=False, default='running') # running, partial, completed, failed
+    attempts = db.Column(db.Integer, nullable=False, default=1)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    items = db.relationship('ProjectCreationItem', backref='creation', lazy=True, order_by='ProjectCreationItem.indice')
+
+class ProjectCreationItem(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    creation_key = db.Column(db.String(64), db.ForeignKey('project_creation.key'), nullable=False)
+    indice = db.Column(db.Integer, nullable=False) # Posición de la partida (00.00, 01.00, ...)
+    nombre = db.Column(db.String(250), nullable=False)
+    page_id = db.Column(db.String(36), nullable=False) # Página de la partida en Notion
+
+    __table_args__ = (db.UniqueConstraint('creation_key', 'indice', name='uq_project_creation_item_indice'),)
+
+def claim_project_creation(key, user_id, nombre_proyecto, num_partidas):
+    """
+    Reserva la solicitud `key` para este intento. Devuelve (creation, error, status_code);
+    una solicitud ya completada se devuelve tal cual para responder sin llamar a Notion.
+    """
+    creation = db.session.get(ProjectCreation, key)
+    if creation is None:
+        creation = ProjectCreation(key=key, user_id=user_id, nombre_proyecto=nombre_proyecto, num_partidas=num_partidas)
+        db.session.add(creation)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Otra petición con la misma clave se adelantó
+            db.session.rollback()
+            return None, 'La misma solicitud ya se está procesando.', 409
+        return creation, None, None
+
+    if creation.user_id != user_id or (creation.nombre_proyecto, creation.num_partidas) != (nombre_proyecto, num_partidas):
+        return None, 'La clave de la solicitud ya se usó con otros datos.', 422
+    if creation.state == 'completed':
+        return creation, None, None
+
+    # Se retoma solo si nadie la está procesando o si el intento anterior quedó colgado
+    stale_before = datetime.utcnow() - timedelta(seconds=PROJECT_CREATION_STALE)
+    claimed = db.session.execute(
+        update(ProjectCreation)
+        .where(ProjectCreation.key == key, or_(ProjectCreation.state != 'running', ProjectCreation.updated_at < stale_before))
+        .values(state='running', attempts=ProjectCreation.attempts + 1, updated_at=datetime.utcnow())
+    ).rowcount
+    db.session.commit()
+    if not claimed:
+        return None, 'La misma solicitud ya se está procesando.', 409
+    db.session.refresh(creation)
+    return creation, None, None
+
+def run_project_creation(creation):
+    """
+    Crea (o completa) el proyecto y sus partidas de una solicitud reservada. En un reintento
+    primero se recupera de Notion lo que el intento anterior llegó a crear, para no duplicarlo.
+    Devuelve la lista de partidas de `crear_partidas`, o None si no se pudo crear el proyecto.
+    """
+    from nuevosRegistros import crear_proyecto, crear_partidas_en_bucle, buscar_proyecto, buscar_partidas
+    retry = creation.attempts > 1
+    try:
+        if not creation.proyecto_id:
+            proyecto_id = buscar_proyecto(creation.nombre_proyecto, creation.created_at) if retry else None
+            proyecto_id = proyecto_id or crear_proyecto(creation.nombre_proyecto)
+            if not proyecto_id:
+                creation.state = 'failed'
+                db.session.commit()
+                return None
+            creation.proyecto_id = proyecto_id
+            db.session.commit()
+
+        existentes = {item.nombre: item.page_id for item in creation.items}
+        if retry:
+            # Partidas que Notion creó aunque su respuesta no llegó a guardarse
+            existentes.update(buscar_partidas(creation.proyecto_id))
+        # Todas las partidas salen a la vez desde un bucle asyncio; el limitador marca el ritmo
+        partidas = crear_partidas_en_bucle(creation.num_partidas, creation.proyecto_id, creation.nombre_proyecto, existentes=existentes)
+
+        known = {item.indice for item in creation.items}
+        rows = [{
+            'creation_key': creation.key,
+            'indice': partida['indice'],
+            'nombre': partida['nombre'],
+            'page_id': partida['id'],
+        } for partida in partidas if partida['id'] and partida['indice'] not in known]
+        if rows:
+            db.session.execute(insert(ProjectCreationItem), rows)
+        creation.state = 'completed' if all(partida['id'] for partida in partidas) else 'partial'
+        creation.updated_at = datetime.utcnow()
+        db.session.commit()
+        return partidas
+    except Exception:
+        db.session.rollback()
+        creation.state = 'failed'
+        db.session.commit()
+        raise
+
+# ==========================================
+# Tokens de restablecimiento de contraseña
+# ==========================================
+RESET_TOKEN_TTL = 3600 # Segundos de validez de un enlace de restablecimiento
+RESET_TOKEN_PURGE_INTERVAL = 3600 # Segundos entre limpiezas de tokens caducados o usados
+
+class PasswordResetToken(db.Model):
+    # Solo se guarda el hash: una copia de la tabla no permite usar los enlaces pendientes
+    token_hash = db.Column(db.String(64), primary_key=True) # SHA-256 del token enviado por correo
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True) # Índice para la limpieza periódica
+    used_at = db.Column(db.DateTime) # Se marca al restablecer la contraseña (un solo uso)
+
+def _reset_token_hash(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+def issue_reset_token(user):
+    # Emitir un token nuevo invalida los anteriores del usuario. El nonce aleatorio hace
+    # distintos dos tokens firmados en el mismo segundo (la marca de tiempo va en segundos)
+    token = s.dumps({'email': user.email, 'nonce': secrets.token_urlsafe(16)}, salt='recover-key')
+    now = datetime.utcnow()
+    db.session.execute(
+        update(PasswordResetToken)
+        .where(PasswordResetToken.user_id == user.id, PasswordResetToken.used_at.is_(None))
+        .values(used_at=now)
+    )
+    db.session.add(PasswordResetToken(
+        token_hash=_reset_token_hash(token),
+        user_id=user.id,
+        created_at=now,
+        expires_at=now + timedelta(seconds=RESET_TOKEN_TTL)
+    ))
+    db.session.commit()
+    reset_token_purger.start()
+    return token
+
+def find_reset_token(token):
+    # Búsqueda por clave primaria; None si no existe, ya se usó o caducó
+    entry = db.session.get(PasswordResetToken, _reset_token_hash(token))
+    if entry is None or entry.used_at is not None or entry.expires_at <= datetime.utcnow():
+        return None
+    return entry
+
+def consume_reset_token(token):
+    # Marcado condicional: de dos envíos simultáneos del mismo enlace solo uno lo consume
+    now = datetime.utcnow()
+    return db.session.execute(
+        update(PasswordResetToken)
+        .where(
+            PasswordResetToken.token_hash == _reset_token_hash(token),
+            PasswordResetToken.used_at.is_(None),
+            PasswordResetToken.expires_at > now
+        )
+        .values(used_at=now)
+    ).rowcount == 1
+
+def purge_reset_tokens():
+    # Los tokens usados se conservan hasta su caducidad original para poder informar del intento
+    deleted = db.session.execute(
+        delete(PasswordResetToken).where(PasswordResetToken.expires_at <= datetime.utcnow())
+    ).rowcount
+    db.session.commit()
+    return deleted
+
+class ResetTokenPurger:
+    """
+    Hilo que borra los tokens caducados cada RESET_TOKEN_PURGE_INTERVAL segundos.
+    Se arranca con el primer token emitido, ya dentro del proceso worker.
+    """
+
+    def __init__(self, interval=RESET_TOKEN_PURGE_INTERVAL):
+        self.interval = interval
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='reset-token-purge', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with app.app_context():
+                try:
+                    deleted = purge_reset_tokens()
+                    if deleted:
+                        moverHorarios02.logger.info(f"Tokens de restablecimiento caducados eliminados: {deleted}")
+                except Exception:
+                    db.session.rollback()
+                    moverHorarios02.logger.exception("Error al eliminar tokens de restablecimiento caducados")
+
+reset_token_purger = ResetTokenPurger()
+
 # ===========================================
 # Definición de la ruta / (página principal):
 # ===========================================
@@ -175,18 +1417,10 @@ def recover_password():
         user = User.query.filter_by(username=username, email=email).first()
 
         if user:
-            token = s.dumps(user.email, salt='recover-key')
+            token = issue_reset_token(user)
             link = url_for('reset_password', token=token, _external=True)
-            print(f"Reset password link: {link}") # Log the reset password link
-
-            # Store the token in the database
-            audit_log = AuditLog(
-                user_id=user.id,
-                action='Solicitud de restablecimiento de contraseña',
-                details=f'Token de restablecimiento de contraseña: {token}'
-            )
-            db.session.add(audit_log)
-            db.session.commit()
+            # El historial no guarda el token: solo la tabla de tokens (por hash) permite validarlo
+            audit_writer.record(user.id, 'Solicitud de restablecimiento de contraseña')
 
             msg = Message('Restablecer Contraseña', sender=app.config['MAIL_DEFAULT_SENDER'], recipients=[user.email])
             msg.body = f"Para restablecer tu contraseña, haz clic en el siguiente enlace: {link}"
@@ -203,14 +1437,13 @@ def recover_password():
 @app.route('/reset_password/<token>', methods=['GET', 'POST'])
 def reset_password(token):
     try:
-        email = s.loads(token, salt='recover-key', max_age=3600)
+        email = s.loads(token, salt='recover-key', max_age=3600)['email']
     except:
         flash('El enlace para restablecer la contraseña es inválido o ha expirado.', 'danger')
         return redirect(url_for('login'))
 
-    # Verify that the token has not been used before
-    audit_log = AuditLog.query.filter_by(details=f'Token de restablecimiento de contraseña: {token}').first()
-    if not audit_log:
+    # El token debe existir, no haber caducado y no haberse usado
+    if find_reset_token(token) is None:
         flash('El enlace para restablecer la contraseña es inválido o ha expirado.', 'danger')
         return redirect(url_for('login'))
 
@@ -225,12 +1458,14 @@ def reset_password(token):
         user = User.query.filter_by(email=email).first()
 
         if user:
+            if not consume_reset_token(token):
+                db.session.rollback()
+                flash('El enlace para restablecer la contraseña es inválido o ha expirado.', 'danger')
+                return redirect(url_for('login'))
             hashed_password = generate_password_hash(password)
             user.password = hashed_password
-
-            # Delete the token from the database
-            db.session.delete(audit_log)
             db.session.commit()
+            audit_writer.record(user.id, 'Restablecimiento de contraseña')
 
             flash('La contraseña se ha restablecido correctamente.', 'success')
             return redirect(url_for('login'))
@@ -240,24 +1475,63 @@ def reset_password(token):
 
     return render_template('reset_password.html', token=token)
 
+def _project_creation_error(creation, error):
+    # Sin proyecto en Notion no hay nada que completar: se entrega una clave nueva para que el
+    # usuario pueda corregir el formulario. Con proyecto se conserva la clave y reenviar lo completa
+    body = {'error': error}
+    if not creation.proyecto_id:
+        body['next_idempotency_key'] = uuid.uuid4().hex
+    return body
+
 @app.route('/create_project', methods=['GET', 'POST'])
 @login_required
 def create_project():
     if request.method == 'POST':
-        from nuevosRegistros import crear_proyecto, crear_partidas  # Importa las funciones aquí para evitar problemas de dependencia circular
         nombre_proyecto = request.form['nombre_proyecto']
         num_partidas = int(request.form['num_partidas'])
-
-        proyecto_page_id = crear_proyecto(nombre_proyecto)
-        if proyecto_page_id:
-            partidas_ids = crear_partidas(num_partidas, proyecto_page_id)
-            if partidas_ids:
-                return jsonify({'message': f'Proyecto "{nombre_proyecto}" creado con éxito con {len(partidas_ids)} partidas.'})
-            else:
-                return jsonify({'error': 'Error al crear las partidas.'}), 500
+        # La clave identifica el envío: reenviar el mismo formulario no duplica el proyecto
+        key = (request.form.get('idempotency_key') or request.headers.get('Idempotency-Key') or '').strip()[:64] or uuid.uuid4().hex
+
+        creation, error, status = claim_project_creation(key, current_user.id, nombre_proyecto, num_partidas)
+        if error:
+            body = {'error': error}
+            if status == 422:
+                # El formulario cambió tras un error: el siguiente envío es otra solicitud
+                body['next_idempotency_key'] = uuid.uuid4().hex
+            return jsonify(body), status
+
+        if creation.state == 'completed':
+            # Reintento de una solicitud ya terminada: se responde con lo guardado
+            partidas = [{'indice': item.indice, 'nombre': item.nombre, 'id': item.page_id, 'error': None} for item in creation.items]
+        else:
+            try:
+                partidas = run_project_creation(creation)
+            except Exception as e:
+                moverHorarios02.logger.error(f"Error al crear el proyecto '{nombre_proyecto}': {e}")
+                return jsonify(_project_creation_error(creation, f'Error al crear el proyecto: {e}')), 500
+            if partidas is None:
+                return jsonify(_project_creation_error(creation, 'Error al crear el proyecto.')), 500
+
+        creadas = [partida for partida in partidas if partida['id']]
+        if creadas and len(creadas) == num_partidas:
+            return jsonify({
+                'message': f'Proyecto "{nombre_proyecto}" creado con éxito con {len(creadas)} partidas.',
+                'proyecto_id': creation.proyecto_id,
+                'partidas': partidas,
+                'next_idempotency_key': uuid.uuid4().hex
+            })
+        elif creadas:
+            # Se conserva la clave: reenviar el formulario completa las partidas que faltan
+            return jsonify({
+                'error': f'Proyecto "{nombre_proyecto}" creado, pero solo se crearon {len(creadas)} de {num_partidas} partidas. Vuelve a enviar para completarlas.',
+                'proyecto_id': creation.proyecto_id,
+                'partidas': partidas
+            }), 207
         else:
-            return jsonify({'error': 'Error al crear el proyecto.'}), 500
-    return render_template('create_project.html')
+            body = _project_creation_error(creation, 'Error al crear las partidas.')
+            body['partidas'] = partidas
+            return jsonify(body), 500
+    return render_template('create_project.html', idempotency_key=uuid.uuid4().hex)
 
 @app.route('/adjust_dates', methods=['GET'])
 @login_required
@@ -271,91 +1545,233 @@ def adjust_dates():
 def run_script():
     if request.method == 'GET':
         return redirect(url_for('adjust_dates'))
-    print("DEBUG: Inicio de la función run_script()")
     try:
-        print("DEBUG: Dentro del bloque try")
-        hours_to_adjust = int(request.form.get("hours"))  # Nombre más descriptivo para la variable
-
-        # Verificar si el checkbox 'move_backward' está marcado
-        move_backward = request.form.get("move_backward") == 'on' # Devuelve True si está marcado, False si no
-
-        # Ajustar las horas para restar si el checkbox está marcado
-        hours = hours_to_adjust if not move_backward else - hours_to_adjust
- 
-        start_date_str = request.form.get("start_date")
-        if not start_date_str:
-            return jsonify({"error": "Debes seleccionar una fecha"}), 400
-        start_date = datetime.strptime(start_date_str, "%Y-%m-%d")
-
-        # Recoger los filtros del formulario
-        property_filters = {}
-        property_name_1 = request.form.get("property_name_1")
-        property_value_1 = request.form.get("property_value_1")
-        property_name_2 = request.form.get("property_name_2")
-        property_value_2 = request.form.get("property_value_2")
-
-        # Construir diccionario de filtros solo si se proporcionaron valores
-        if property_name_1 and property_value_1:
-            property_filters[property_name_1] = property_value_1
-        if property_name_2 and property_value_2:
-            property_filters[property_name_2] = property_value_2
-
-        # Llamar a la función adjust_dates_api con los filtros
-        result_dict = moverHorarios02.adjust_dates_api(hours, start_date_str, property_filters=property_filters)
-
-        # *** LOGGING current_user ***
-        print(f"*** run_script: current_user = {current_user}, current_user.id = {current_user.id if current_user else None}") # Log current_user and current_user.id
-        # *** FIN LOGGING current_user ***
-
-        # *** PRUEBA DE PERSISTENCIA - ESCRITURA ***
-        print("DEBUG: Intentando escribir registro de prueba de persistencia...") # NUEVO LOGGING - PRUEBA PERSISTENCIA ESCRITURA
-        prueba_persist_log = AuditLog(
-            user_id=current_user.id,
-            action='PRUEBA DE PERSISTENCIA - ESCRITURA', # Acción especial para prueba
-            details='Este es un registro de prueba para verificar persistencia en Render'
-        )
-        db.session.add(prueba_persist_log)
-        # *** FIN PRUEBA DE PERSISTENCIA - ESCRITURA ***
-
-        # *** LOGGING current_user ***
-        print(f"*** run_script: current_user = {current_user}, current_user.id = {current_user.id if current_user else None}") # Log current_user and current_user.id
-        # *** FIN LOGGING current_user ***
-
-        # *** REGISTRO DE AUDITORÍA CON LOGGING DETALLADO ***
-        print("DEBUG: Antes de crear objeto AuditLog") # NUEVO LOGGING - ANTES DE CREAR AuditLog
-        audit_log = AuditLog(
-            user_id=current_user.id,
-            action='Ajuste de Horarios',
-            details=f'Horas ajustadas: {hours}, Fecha de inicio: {start_date_str}, Filtros: {property_filters}, Resultado API: {result_dict}'
-        )
-        print("DEBUG: Después de crear objeto AuditLog") # NUEVO LOGGING - DESPUÉS DE CREAR AuditLog
-        db.session.add(audit_log)
-        print("DEBUG: Después de db.session.add(audit_log), ANTES de commit") # NUEVO LOGGING - DESPUÉS DE ADD, ANTES DE COMMIT
-        print(f"*** INTENTANDO HACER COMMIT DEL REGISTRO DE AUDITORÍA: {audit_log}") # LOGGING ANTES DEL COMMIT (YA EXISTENTE)
-        db.session.commit()
-        print("*** COMMIT DEL REGISTRO DE AUDITORÍA EXITOSO") # LOGGING DESPUÉS DEL COMMIT (YA EXISTENTE)
-        print("DEBUG: Después de db.session.commit()") # NUEVO LOGGING - DESPUÉS DE COMMIT
-        # *** FIN REGISTRO DE AUDITORÍA CON LOGGING DETALLADO ***
-
-        # *** PRUEBA DE PERSISTENCIA - LECTURA ***
-        print("DEBUG: Intentando leer registro de prueba de persistencia...") # NUEVO LOGGING - PRUEBA PERSISTENCIA LECTURA
-        prueba_persist_leido = AuditLog.query.filter_by(action='PRUEBA DE PERSISTENCIA - ESCRITURA').first() # Busca registro de prueba
-        if prueba_persist_leido:
-            print("DEBUG: Registro de prueba de persistencia LEÍDO exitosamente de la base de datos en Render!") # LOGGING - PRUEBA PERSISTENCIA LECTURA ÉXITO
+        preview_id = request.form.get("preview_id")
+        if preview_id:
+            # Confirmación de una vista previa: se aplican exactamente las páginas mostradas
+            preview = claim_preview(preview_id, current_user.id)
+            if preview is None:
+                return jsonify({"error": "La vista previa expiró. Genera una nueva antes de confirmar."}), 410
+            params = dict(preview.params, preview_id=preview_id)
+            job = enqueue_adjustment_job(current_user.id, params, pages=preview.pages)
         else:
-            print("DEBUG: NO SE ENCONTRÓ registro de prueba de persistencia en la base de datos en Render!") # LOGGING - PRUEBA PERSISTENCIA LECTURA FALLO
-        # *** FIN PRUEBA DE PERSISTENCIA - LECTURA ***
+            params, error = _adjustment_params_from_form(request.form)
+            if error:
+                return jsonify({"error": error}), 400
+            # Encolar el ajuste: la petición responde de inmediato con el identificador del trabajo
+            job = enqueue_adjustment_job(current_user.id, params)
+
+        # El registro de auditoría del ajuste lo encola el trabajo al terminar (_run_adjustment_job)
+        return jsonify({
+            "job_id": job.id,
+            "status_url": url_for('job_status', job_id=job.id),
+            "message": "Ajuste en cola. Consulta el estado del trabajo para ver el progreso."
+        }), 202
 
-        if result_dict.get("success"):
-            return jsonify({"message": result_dict.get("message")})
-        else:
-            return jsonify({"error": result_dict.get("error")}), 500
+    except Exception as e:
+        moverHorarios02.logger.exception("Error en run_script")
+        return jsonify({"error": str(e)}), 500
 
+@app.route('/run_batch', methods=['POST'])
+@login_required
+def run_batch():
+    # Varias operaciones (p. ej. tras una avería) combinadas en un único PATCH por página
+    operations, error = _batch_operations_from_json(request.get_json(silent=True))
+    if error:
+        return jsonify({"error": error}), 400
+    job = enqueue_adjustment_job(current_user.id, {'operations': operations})
+    return jsonify({
+        "job_id": job.id,
+        "status_url": url_for('job_status', job_id=job.id),
+        "message": f"Lote de {len(operations)} operaciones en cola. Cada página se actualizará una sola vez con su desplazamiento neto."
+    }), 202
+
+@app.route('/preview_adjustment', methods=['POST'])
+@login_required
+def preview_adjustment():
+    params, error = _adjustment_params_from_form(request.form)
+    if error:
+        return jsonify({"error": error}), 400
+    try:
+        start_date = datetime.strptime(params['start_date'], "%Y-%m-%d")
+        # Misma selección que el ajuste real (copia local si está reciente), sin ningún PATCH ni
+        # sincronización dentro de la petición
+        filters = moverHorarios02.build_filter_from_properties(params['property_filters'])
+        target_pages = select_target_pages(start_date, params['property_filters'], sync=False)
+        preview = moverHorarios02.preview_date_adjustment(params['hours'], start_date, filters, pages=target_pages)
+    except ValueError as e:
+        return jsonify({"error": f"Filtro inválido: {e}"}), 400
     except Exception as e:
-        print(f"*** ERROR en run_script: {e}") # Imprime el mensaje de error básico
-        import traceback # Importa la librería traceback
-        traceback.print_exc() # Imprime el traceback completo del error
-        return jsonify({"error": str(e)}), 500  
+        moverHorarios02.logger.error(f"Error al generar la vista previa: {e}")
+        return jsonify({"error": f"Error al generar la vista previa: {e}"}), 500
+
+    entry = save_preview(current_user.id, params, preview)
+    return jsonify(_preview_page(entry, 1, request.form.get('page_size', PREVIEW_PAGE_SIZE, type=int)))
+
+@app.route('/preview_adjustment/<preview_id>', methods=['GET'])
+@login_required
+def preview_adjustment_page(preview_id):
+    preview = find_preview(preview_id, current_user.id)
+    if preview is None:
+        return jsonify({"error": "La vista previa expiró. Genera una nueva."}), 404
+    page = request.args.get('page', 1, type=int)
+    page_size = request.args.get('page_size', PREVIEW_PAGE_SIZE, type=int)
+    return jsonify(_preview_page(preview, page, page_size))
+
+@app.route('/api/properties', methods=['GET'])
+@login_required
+def api_properties():
+    # Propiedades del esquema en caché para rellenar los desplegables del formulario
+    properties = [
+        prop for prop in moverHorarios02.list_available_properties()
+        if prop['filterable'] and prop['name'] != moverHorarios02.DATE_PROPERTY_NAME
+    ]
+    for prop in properties:
+        prop['autocomplete'] = prop['type'] in CATALOG_TYPES
+    return jsonify({"properties": sorted(properties, key=lambda prop: prop['name'].casefold())})
+
+@app.route('/api/properties/<path:name>/values', methods=['GET'])
+@login_required
+def api_property_values(name):
+    prefix = request.args.get('prefix', '')
+    limit = max(1, min(request.args.get('limit', CATALOG_LIMIT, type=int), 100))
+    return jsonify({"property": name, "values": get_value_catalog().complete(name, prefix, limit)})
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+@login_required
+def job_status(job_id):
+    job = db.session.get(AdjustmentJob, job_id)
+    if job is None or job.user_id != current_user.id:
+        return jsonify({"error": "Trabajo no encontrado"}), 404
+    return jsonify(job.to_dict())
+
+def _sse(event):
+    # El id es un resumen del contenido: al reconectar no se reenvía un estado que el cliente ya tiene
+    data = json.dumps(event, sort_keys=True)
+    event_id = hashlib.sha1(data.encode('utf-8')).hexdigest()[:16]
+    return event_id, f"id: {event_id}\ndata: {data}\n\n"
+
+@app.route('/jobs/<job_id>/resume', methods=['POST'])
+@login_required
+def resume_job(job_id):
+    job = db.session.get(AdjustmentJob, job_id)
+    if job is None or job.user_id != current_user.id:
+        return jsonify({"error": "Trabajo no encontrado"}), 404
+    if not job.is_resumable():
+        return jsonify({"error": "El trabajo sigue en ejecución o no tiene páginas pendientes"}), 409
+    if AdjustmentJob.query.filter_by(rollback_of=job.id).first():
+        return jsonify({"error": "El trabajo ya fue revertido"}), 409
+    if not resume_adjustment_job(job):
+        return jsonify({"error": "El trabajo ya se está reanudando"}), 409
+    return jsonify({
+        "job_id": job.id,
+        "status_url": url_for('job_status', job_id=job.id),
+        "message": "Reanudando el ajuste desde su diario."
+    }), 202
+
+@app.route('/jobs/<job_id>/rollback', methods=['POST'])
+@login_required
+def rollback_job(job_id):
+    job = db.session.get(AdjustmentJob, job_id)
+    if job is None or job.user_id != current_user.id:
+        return jsonify({"error": "Trabajo no encontrado"}), 404
+    if job.is_active():
+        return jsonify({"error": "El trabajo sigue en ejecución"}), 409
+    previous = AdjustmentJob.query.filter_by(rollback_of=job.id).first()
+    if previous:
+        return jsonify({
+            "error": "El trabajo ya tiene una reversión",
+            "status_url": url_for('job_status', job_id=previous.id)
+        }), 409
+    try:
+        rollback = enqueue_rollback_job(current_user.id, job)
+    except IntegrityError:
+        # Otra petición creó la reversión al mismo tiempo (rollback_of es único)
+        db.session.rollback()
+        return jsonify({"error": "El trabajo ya tiene una reversión"}), 409
+    return jsonify({
+        "job_id": rollback.id,
+        "status_url": url_for('job_status', job_id=rollback.id),
+        "message": "Reversión en cola. Solo se restauran las páginas que cambió el ajuste."
+    }), 202
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+@login_required
+def job_events(job_id):
+    job = db.session.get(AdjustmentJob, job_id)
+    if job is None or job.user_id != current_user.id:
+        return jsonify({"error": "Trabajo no encontrado"}), 404
+    first_event = job.to_event()
+    db.session.commit() # No mantener abierta una transacción durante todo el stream
+    last_event_id = request.headers.get('Last-Event-ID')
+
+    def stream():
+        # Un stream no retiene el worker más de JOB_EVENTS_MAX_DURATION: se cierra y el
+        # navegador reconecta, de modo que un worker síncrono nunca llega a su timeout
+        deadline = time.monotonic() + JOB_EVENTS_MAX_DURATION
+        event_id, message = _sse(first_event)
+        yield f"retry: {JOB_EVENTS_RETRY_MS}\n"
+        if event_id != last_event_id or first_event['state'] in JOB_FINAL_STATES:
+            yield message
+        else:
+            yield ": sin cambios\n\n"
+        if first_event['state'] in JOB_FINAL_STATES:
+            return
+        seq = 0
+        last_event = first_event
+        discarded = False
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            if progress_broker.knows(job_id):
+                # El trabajo corre en este proceso: esperar al siguiente evento
+                seq, event = progress_broker.wait(job_id, seq, min(JOB_EVENTS_KEEPALIVE, remaining))
+                if event is None:
+                    # Terminó y se descartó: la siguiente vuelta lee ya el estado final
+                    discarded = True
+                    continue
+                if event is last_event:
+                    yield ": keepalive\n\n"
+                    continue
+            else:
+                # El trabajo corre en otro worker (o acaba de terminar): leer su último estado
+                if not discarded:
+                    time.sleep(min(JOB_PROGRESS_INTERVAL, remaining))
+                discarded = False
+                current = db.session.get(AdjustmentJob, job_id, populate_existing=True)
+                event = current.to_event()
+                db.session.commit()
+                if event == last_event:
+                    continue
+            last_event = event
+            yield _sse(event)[1]
+            if event['state'] in JOB_FINAL_STATES:
+                return
+
+    response = Response(stream_with_context(stream()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no' # Evita que un proxy acumule el stream
+    return response
+
+# ================================
+# Métricas (formato Prometheus)
+# ================================
+# /metrics exige 'Authorization: Bearer <METRICS_TOKEN>'. Sin token el endpoint no existe (404),
+# salvo que METRICS_PUBLIC=1 lo abra explícitamente (p. ej. detrás de una red interna)
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+METRICS_PUBLIC = os.environ.get('METRICS_PUBLIC', '0') == '1'
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    # Sin login: el scraper de Prometheus no tiene sesión; se protege con el token
+    if METRICS_TOKEN:
+        authorization = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(authorization.encode('utf-8'), f'Bearer {METRICS_TOKEN}'.encode('utf-8')):
+            return Response('No autorizado\n', status=401, mimetype='text/plain')
+    elif not METRICS_PUBLIC:
+        return Response('No encontrado\n', status=404, mimetype='text/plain')
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
 
 # ================================
 # Ejecución de la aplicación Flask
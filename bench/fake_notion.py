@@ -0,0 +1,296 @@
+"""
+Servidor HTTP local que imita la API de Notion (2022-06-28) para medir el motor de
+ajustes y la creación de partidas sin tocar producción.
+
+Implementa:
+    GET   /v1/databases/<id>          esquema de la base de datos
+    POST  /v1/databases/<id>/query    consulta paginada con cursor, filtros y filter_properties
+    GET   /v1/pages/<id>              página
+    PATCH /v1/pages/<id>              actualización de propiedades
+    POST  /v1/pages                   creación de página
+
+Inyecta latencia configurable, respuestas 429 con Retry-After y errores 500.
+
+Uso independiente:
+    python bench/fake_notion.py --pages 10000 --port 8765 --latency 0.01 --rate-limit-every 50
+"""
+import argparse
+import json
+import random
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+DATABASE_ID = "fake-planes"
+DATE_PROPERTY_NAME = "Date"
+CLIENTS = ("ACME", "Globex", "Initech", "Umbrella", "Hooli")
+SCHEMA = {
+    "Date": {"id": "d%3A01", "name": "Date", "type": "date", "date": {}},
+    "Cliente": {"id": "c%3A01", "name": "Cliente", "type": "select",
+                "select": {"options": [{"name": name} for name in CLIENTS]}},
+    "ID del proyecto": {"id": "title", "name": "ID del proyecto", "type": "title", "title": {}},
+    "ID de partida": {"id": "p%3A01", "name": "ID de partida", "type": "rich_text", "rich_text": {}},
+    "Proyectos": {"id": "r%3A01", "name": "Proyectos", "type": "relation", "relation": {}},
+}
+
+
+class FakeNotionState:
+    """
+    Páginas en memoria (en orden de creación) y parámetros de inyección de fallos.
+    """
+
+    def __init__(self, pages=1000, latency=0.0, jitter=0.0, rate_limit_every=0, retry_after=0.0,
+                 error_rate=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.pages = {}
+        self.order = []
+        base = datetime(2025, 1, 6, 7, 0)
+        for i in range(pages):
+            start = base + timedelta(hours=i % 2000)
+            self._add_page(f"{i:08d}-0000-4000-8000-000000000000", {
+                "Date": {"id": "d%3A01", "type": "date", "date": {
+                    "start": start.strftime("%Y-%m-%dT%H:%M:%S.000-06:00"),
+                    "end": (start + timedelta(hours=2)).strftime("%Y-%m-%dT%H:%M:%S.000-06:00"),
+                    "time_zone": None,
+                }},
+                "Cliente": {"id": "c%3A01", "type": "select", "select": {"name": CLIENTS[i % len(CLIENTS)]}},
+                "ID del proyecto": {"id": "title", "type": "title", "title": [
+                    {"type": "text", "text": {"content": f"PRJ-{i // 10:05d}"}, "plain_text": f"PRJ-{i // 10:05d}"}
+                ]},
+            })
+
+    def _add_page(self, page_id, properties, parent=DATABASE_ID):
+        now = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:00.000Z")
+        self.pages[page_id] = {
+            "object": "page",
+            "id": page_id,
+            "created_time": now,
+            "last_edited_time": now,
+            "archived": False,
+            "parent": {"type": "database_id", "database_id": parent},
+            "properties": properties,
+        }
+        self.order.append(page_id)
+        return self.pages[page_id]
+
+    def next_fault(self):
+        # Devuelve (status, retry_after) si esta petición debe fallar
+        with self.lock:
+            self.requests += 1
+            count = self.requests
+            roll = self.random.random()
+        if self.rate_limit_every and count % self.rate_limit_every == 0:
+            return 429, self.retry_after
+        if self.error_rate and roll < self.error_rate:
+            return 500, None
+        return None, None
+
+    def delay(self):
+        if self.latency or self.jitter:
+            time.sleep(self.latency + self.random.uniform(0, self.jitter))
+
+
+def _plain_text(prop):
+    items = prop.get("title") or prop.get("rich_text") or []
+    return "".join(item.get("plain_text") or item.get("text", {}).get("content", "") for item in items)
+
+
+def _parse_date(value):
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).replace(tzinfo=None)
+
+
+def _matches(page, condition):
+    # Evaluador mínimo de filtros: suficiente para los filtros que genera mH2
+    if "and" in condition:
+        return all(_matches(page, child) for child in condition["and"])
+    if "or" in condition:
+        return any(_matches(page, child) for child in condition["or"])
+    prop = page["properties"].get(condition.get("property"), {})
+    if "date" in condition:
+        value = (prop.get("date") or {}).get("start")
+        rule = condition["date"]
+        if "on_or_after" in rule:
+            return value is not None and _parse_date(value).date() >= _parse_date(rule["on_or_after"]).date()
+        if "on_or_before" in rule:
+            return value is not None and _parse_date(value).date() <= _parse_date(rule["on_or_before"]).date()
+        return True
+    for key in ("select", "status"):
+        if key in condition:
+            value = (prop.get(key) or {}).get("name")
+            rule = condition[key]
+            if "equals" in rule:
+                return value == rule["equals"]
+            if "does_not_equal" in rule:
+                return value != rule["does_not_equal"]
+    if "rich_text" in condition or "title" in condition:
+        rule = condition.get("rich_text") or condition.get("title")
+        text = _plain_text(prop)
+        if "contains" in rule:
+            return rule["contains"].lower() in text.lower()
+        if "equals" in rule:
+            return text == rule["equals"]
+    if "relation" in condition:
+        related = {item["id"] for item in prop.get("relation", [])}
+        return condition["relation"].get("contains") in related
+    return True
+
+
+def _project(page, property_ids):
+    if not property_ids:
+        return page
+    projected = dict(page)
+    projected["properties"] = {
+        name: value for name, value in page["properties"].items()
+        if value.get("id") in property_ids or SCHEMA.get(name, {}).get("id") in property_ids
+    }
+    return projected
+
+
+class FakeNotionHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # keep-alive, como api.notion.com
+    state: FakeNotionState = None
+
+    def setup(self):
+        super().setup()
+        # Cabeceras y cuerpo salen en escrituras separadas: sin TCP_NODELAY el ACK retardado añade ~40 ms
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _handle(self, method):
+        url = urlparse(self.path)
+        parts = [part for part in url.path.split("/") if part]
+        body = self._body() if method in ("POST", "PATCH") else {}
+        self.state.delay()
+
+        status, retry_after = self.state.next_fault()
+        if status == 429:
+            return self._send(429, {"object": "error", "status": 429, "code": "rate_limited", "message": "Rate limited"},
+                              {"Retry-After": str(retry_after)})
+        if status == 500:
+            return self._send(500, {"object": "error", "status": 500, "code": "internal_server_error", "message": "Fallo inyectado"})
+
+        if parts[:2] != ["v1", "databases"] and parts[:2] != ["v1", "pages"]:
+            return self._send(404, {"object": "error", "status": 404, "code": "object_not_found", "message": self.path})
+
+        if parts[1] == "databases" and method == "GET" and len(parts) == 3:
+            return self._send(200, {"object": "database", "id": parts[2], "properties": SCHEMA})
+        if parts[1] == "databases" and method == "POST" and len(parts) == 4 and parts[3] == "query":
+            return self._query(body, parse_qs(url.query).get("filter_properties", []))
+        if parts[1] == "pages" and method == "POST" and len(parts) == 2:
+            parent = body.get("parent", {}).get("database_id", DATABASE_ID)
+            with self.state.lock:
+                page = self.state._add_page(str(uuid.uuid4()), body.get("properties", {}), parent)
+            return self._send(200, page)
+
+        page = self.state.pages.get(parts[2]) if len(parts) == 3 else None
+        if page is None:
+            return self._send(404, {"object": "error", "status": 404, "code": "object_not_found", "message": self.path})
+        if method == "GET":
+            return self._send(200, page)
+        if method == "PATCH":
+            with self.state.lock:
+                for name, value in body.get("properties", {}).items():
+                    current = page["properties"].setdefault(name, {"id": SCHEMA.get(name, {}).get("id")})
+                    current.update(value)
+                page["last_edited_time"] = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:00.000Z")
+            return self._send(200, page)
+        return self._send(405, {"object": "error", "status": 405, "message": method})
+
+    def _query(self, body, property_ids):
+        condition = body.get("filter") or {}
+        page_size = min(int(body.get("page_size") or 100), 100)
+        start = int(body.get("start_cursor") or 0)
+        order = self.state.order
+        results = []
+        position = start
+        while position < len(order) and len(results) < page_size:
+            page = self.state.pages[order[position]]
+            position += 1
+            if page["parent"].get("database_id") == DATABASE_ID and _matches(page, condition):
+                results.append(_project(page, set(property_ids)))
+        has_more = position < len(order)
+        return self._send(200, {
+            "object": "list",
+            "results": results,
+            "has_more": has_more,
+            "next_cursor": str(position) if has_more else None,
+        })
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_PATCH(self):
+        self._handle("PATCH")
+
+
+class FakeNotionServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # La cola de listen() por defecto (5) desborda cuando un pool abre muchas conexiones a la
+    # vez y el kernel reintenta los SYN perdidos al cabo de 1 s, lo que falsea la medida
+    request_queue_size = 128
+
+
+def serve(state, host="127.0.0.1", port=0):
+    """
+    Arranca el servidor en un hilo. Devuelve (servidor, url base sin /v1).
+    """
+    handler = type("BoundFakeNotionHandler", (FakeNotionHandler,), {"state": state})
+    server = FakeNotionServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True, name="fake-notion").start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local que imita la API de Notion")
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Segundos fijos por petición")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Segundos aleatorios extra por petición")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="Responde 429 a una de cada N peticiones")
+    parser.add_argument("--retry-after", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probabilidad de responder 500")
+    args = parser.parse_args()
+
+    state = FakeNotionState(args.pages, args.latency, args.jitter, args.rate_limit_every, args.retry_after, args.error_rate)
+    server, url = serve(state, args.host, args.port)
+    print(f"Notion falso en {url}/v1 (base de datos '{DATABASE_ID}', {args.pages} páginas)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""
+Benchmarks del motor de ajustes (mH2.adjust_dates_with_filters) y de la creación de
+partidas (nuevosRegistros.crear_partidas y su variante asyncio) contra el Notion falso de bench/fake_notion.py.
+
+    python bench/run_benchmarks.py                   # 1k, 10k y 50k páginas
+    python bench/run_benchmarks.py --sizes 1000      # solo 1k
+    python bench/run_benchmarks.py --update-baseline # guarda los resultados como línea base
+
+Para cada escenario se informa de páginas/s, latencia p50/p99 por operación (incluye
+reintentos y esperas del limitador) y memoria máxima (tracemalloc). Sale con código 1 si
+algún resultado empeora más que `--tolerance` respecto a bench/baseline.json; la línea
+base depende de la máquina, así que se regenera en la máquina donde se compara.
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+sys.path.insert(0, REPO_DIR)
+
+import fake_notion # noqa: E402
+
+# Métricas comparadas con la línea base: (nombre, True si más alto es mejor)
+METRICS = (("pages_per_sec", True), ("p99_ms", False), ("peak_mb", False))
+LATENCY_FLOOR_MS = 2.0 # Diferencias de latencia menores se consideran ruido
+
+
+def _run_server(pages, latency, jitter, rate_limit_every, error_rate, queue):
+    # Proceso aparte: el servidor no compite por el GIL ni cuenta en la memoria medida
+    state = fake_notion.FakeNotionState(pages, latency, jitter, rate_limit_every, 0.0, error_rate)
+    _, url = fake_notion.serve(state)
+    queue.put(url)
+    threading.Event().wait()
+
+
+def start_server(pages, args):
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(
+        target=_run_server,
+        args=(pages, args.latency, args.jitter, args.rate_limit_every, args.error_rate, queue),
+        daemon=True
+    )
+    process.start()
+    return process, queue.get(timeout=120)
+
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def _timed(function, latencies):
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - started)
+    return wrapper
+
+
+def _timed_async(function, latencies):
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await function(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - started)
+    return wrapper
+
+
+def _measure(run, latencies, items):
+    tracemalloc.start()
+    started = time.perf_counter()
+    done = run()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "items": items,
+        "done": done,
+        "elapsed_s": round(elapsed, 2),
+        "pages_per_sec": round(done / elapsed, 1) if elapsed > 0 else 0.0,
+        "p50_ms": round(statistics.median(latencies) * 1000, 2) if latencies else 0.0,
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 2),
+        "peak_mb": round(peak / (1024 * 1024), 2),
+    }
+
+
+def bench_shift(size, args):
+    import mH2
+    from notionApi import NotionHttpClient, RateLimiter, RetryPolicy
+
+    process, url = start_server(size, args)
+    try:
+        mH2.DATABASE_ID = fake_notion.DATABASE_ID
+        mH2.notion_http = NotionHttpClient(
+            "bench", f"{url}/v1", mH2.NOTION_VERSION,
+            limiter=RateLimiter(args.rate, max(1, int(args.rate)), endpoint_budgets={}),
+            policy=RetryPolicy(base_delay=0.05)
+        )
+        mH2.invalidate_schema_cache()
+        latencies = []
+        original = mH2._safe_update_page
+        mH2._safe_update_page = _timed(original, latencies)
+        counters = {}
+        try:
+            result = _measure(
+                lambda: (mH2.adjust_dates_with_filters(
+                    1, datetime(2025, 1, 1), max_workers=args.workers, on_progress=counters.update
+                ), counters.get("updated", 0))[1],
+                latencies, size
+            )
+        finally:
+            mH2._safe_update_page = original
+            mH2.notion_http.close()
+        result["failed"] = counters.get("failed", 0)
+        return result
+    finally:
+        process.terminate()
+
+
+def bench_partidas(count, args):
+    import httpx
+    from notion_client import Client
+    import nuevosRegistros
+
+    process, url = start_server(0, args)
+    try:
+        nuevosRegistros.DATABASE_ID_PARTIDAS = "fake-partidas"
+        nuevosRegistros.notion = Client(auth="bench", base_url=url, client=httpx.Client(base_url=url))
+        latencies = []
+        original = nuevosRegistros._crear_partida
+        nuevosRegistros._crear_partida = _timed(original, latencies)
+        try:
+            # crear_partidas informa de cada partida con print: se descarta durante la medida
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                return _measure(
+                    lambda: sum(1 for partida in nuevosRegistros.crear_partidas(
+                        count, "00000000-0000-4000-8000-00000000beef", "BENCH", max_workers=args.workers
+                    ) if partida["id"]),
+                    latencies, count
+                )
+        finally:
+            nuevosRegistros._crear_partida = original
+    finally:
+        process.terminate()
+
+
+def bench_partidas_async(count, args):
+    import nuevosRegistros
+
+    process, url = start_server(0, args)
+    try:
+        nuevosRegistros.DATABASE_ID_PARTIDAS = "fake-partidas"
+        nuevosRegistros.API_BASE_URL = f"{url}/v1"
+        latencies = []
+        original = nuevosRegistros._crear_partida_async
+        nuevosRegistros._crear_partida_async = _timed_async(original, latencies)
+        try:
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                return _measure(
+                    lambda: sum(1 for partida in nuevosRegistros.crear_partidas_en_bucle(
+                        count, "00000000-0000-4000-8000-00000000beef", "BENCH"
+                    ) if partida["id"]),
+                    latencies, count
+                )
+        finally:
+            nuevosRegistros._crear_partida_async = original
+    finally:
+        process.terminate()
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if not reference:
+            continue
+        for metric, higher_is_better in METRICS:
+            current, expected = result.get(metric), reference.get(metric)
+            if current is None or not expected:
+                continue
+            if higher_is_better and current < expected * (1 - tolerance):
+                regressions.append(f"{name}: {metric} {current} < {expected} (-{tolerance:.0%})")
+            elif not higher_is_better and current > expected * (1 + tolerance):
+                if metric.endswith("_ms") and current - expected < LATENCY_FLOOR_MS:
+                    continue
+                regressions.append(f"{name}: {metric} {current} > {expected} (+{tolerance:.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks del motor de ajustes contra un Notion falso")
+    parser.add_argument("--sizes", default="1000,10000,50000", help="Tamaños de la base de datos, separados por comas")
+    parser.add_argument("--partidas", type=int, default=200, help="Partidas a crear en el escenario de creación (0 = omitir)")
+    parser.add_argument("--workers", type=int, default=4, help="Hilos de PATCH / creación (NOTION_MAX_CONCURRENT_UPDATES)")
+    parser.add_argument("--rate", type=float, default=10000.0, help="Límite de peticiones/s del cliente durante la prueba")
+    parser.add_argument("--latency", type=float, default=0.005, help="Latencia fija del servidor falso (s)")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="Un 429 cada N peticiones")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Empeoramiento admitido frente a la línea base")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    # La configuración de Notion se lee al importar los módulos del proyecto
+    os.environ.setdefault("NOTION_API_KEY", "bench")
+    os.environ["DATABASE_ID_PLANES"] = fake_notion.DATABASE_ID
+    os.environ["NOTION_RATE_LIMIT"] = str(args.rate)
+    os.environ["NOTION_BURST"] = str(max(1, int(args.rate)))
+    import logging
+    logging.disable(logging.WARNING) # Los logs por página distorsionan la medida
+
+    results = {}
+    for size in [int(value) for value in args.sizes.split(",") if value.strip()]:
+        results[f"shift-{size}"] = bench_shift(size, args)
+        print(f"shift-{size}: {json.dumps(results[f'shift-{size}'])}", flush=True)
+    if args.partidas:
+        results[f"partidas-{args.partidas}"] = bench_partidas(args.partidas, args)
+        print(f"partidas-{args.partidas}: {json.dumps(results[f'partidas-{args.partidas}'])}", flush=True)
+        # Mismo escenario con la ruta asyncio que usa /create_project
+        results[f"partidas-async-{args.partidas}"] = bench_partidas_async(args.partidas, args)
+        print(f"partidas-async-{args.partidas}: {json.dumps(results[f'partidas-async-{args.partidas}'])}", flush=True)
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Línea base actualizada: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("Sin línea base: ejecuta con --update-baseline para crearla")
+        return 0
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f), args.tolerance)
+    incomplete = [name for name, result in results.items() if result["done"] < result["items"]]
+    for name in incomplete:
+        regressions.append(f"{name}: solo se completaron {results[name]['done']} de {results[name]['items']}")
+    if regressions:
+        print("Regresiones detectadas:")
+        for line in regressions:
+            print(f"  - {line}")
+        return 1
+    print("Sin regresiones frente a la línea base")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,20 +1,19 @@
 import requests
+import httpx
 import os
 import logging
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
-from typing import Optional, Dict, List, Tuple, Any, Union
-
-# Configuración de logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("notion_integration.log"),
-        logging.StreamHandler()
-    ]
-)
+from typing import Optional, Dict, List, Tuple, Any, Union, Iterator, Iterable, Callable, Sized, AsyncIterator
+from notionApi import NotionHttpClient, AsyncNotionHttpClient, TTLCache, NOTION_POOL_SIZE
+from metrics import PAGES_PROCESSED, phase
+from notionLogging import configure_logging
+
+# Configuración de logging: cola en segundo plano y archivo rotado y comprimido (ver notionLogging)
+configure_logging()
 logger = logging.getLogger("notion_integration")
 
 # Cargar variables de entorno
@@ -27,39 +26,61 @@ API_BASE_URL = "https://api.notion.com/v1"
 NOTION_VERSION = "2022-06-28"
 DATE_PROPERTY_NAME = "Date"
 REQUEST_TIMEOUT = 30
+# Número máximo de PATCH simultáneos contra Notion durante un ajuste
+MAX_CONCURRENT_UPDATES = int(os.getenv("NOTION_MAX_CONCURRENT_UPDATES", "4"))
+# Segundos que se reutiliza el esquema de la base de datos antes de volver a pedirlo
+SCHEMA_CACHE_TTL = int(os.getenv("NOTION_SCHEMA_CACHE_TTL", "600"))
+# Páginas que se anotan juntas en el diario de un ajuste antes de enviar sus PATCH
+JOURNAL_BATCH_SIZE = 100
+# Segundos entre líneas de progreso agregadas en el log (sustituyen a una línea por página)
+LOG_PROGRESS_INTERVAL = float(os.getenv("NOTION_LOG_PROGRESS_INTERVAL", "10"))
+# IDs de páginas modificadas en Notion (y por tanto no tocadas) que se listan en un resumen
+CHANGED_PAGES_REPORT_LIMIT = 50
 
 # Verifica que las variables de entorno necesarias estén disponibles
 if not NOTION_API_KEY or not DATABASE_ID:
     logger.error("Variables de entorno requeridas no encontradas. Verifica NOTION_API_KEY y DATABASE_ID_PLANES.")
     raise EnvironmentError("Variables de entorno requeridas no encontradas")
 
-HEADERS = {
-    "Authorization": f"Bearer {NOTION_API_KEY}",
-    "Content-Type": "application/json",
-    "Notion-Version": NOTION_VERSION,
-}
+# Cliente compartido con cabeceras predefinidas y pool keep-alive (cubre todos los PATCH en vuelo)
+notion_http = NotionHttpClient(
+    NOTION_API_KEY,
+    base_url=API_BASE_URL,
+    notion_version=NOTION_VERSION,
+    pool_size=max(NOTION_POOL_SIZE, MAX_CONCURRENT_UPDATES),
+    timeout=REQUEST_TIMEOUT
+)
+
+# Esquema de la base de datos (propiedades y tipos), compartido por todas las peticiones del worker
+_schema_cache = TTLCache(ttl=SCHEMA_CACHE_TTL)
 
 def validate_api_connection() -> bool:
-    try:
-        url = f"{API_BASE_URL}/databases/{DATABASE_ID}"
-        response = requests.get(url, headers=HEADERS, timeout=REQUEST_TIMEOUT)
-        response.raise_for_status()
+    # Con el esquema en caché la conexión ya se validó dentro del TTL: no hace falta otra petición
+    if _schema_cache.get(DATABASE_ID) is not None:
+        return True
+    if get_database_properties():
         logger.info("Conexión a la API de Notion validada correctamente")
         return True
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Error al validar la conexión a la API de Notion: {str(e)}")
-        return False
+    return False
 
-def get_database_properties() -> Dict[str, Dict]:
+def invalidate_schema_cache() -> None:
+    _schema_cache.invalidate(DATABASE_ID)
+
+def get_database_properties(force_refresh: bool = False) -> Dict[str, Dict]:
+    if not force_refresh:
+        cached = _schema_cache.get(DATABASE_ID)
+        if cached is not None:
+            return cached
     try:
-        url = f"{API_BASE_URL}/databases/{DATABASE_ID}"
-        response = requests.get(url, headers=HEADERS, timeout=REQUEST_TIMEOUT)
+        with phase("schema"):
+            response = notion_http.get(f"/databases/{DATABASE_ID}", "databases.retrieve")
         response.raise_for_status()
         
         database_info = response.json()
         properties = database_info.get("properties", {})
         
         logger.info(f"Propiedades obtenidas de la base de datos: {', '.join(properties.keys())}")
+        _schema_cache.set(DATABASE_ID, properties)
         return properties
     except requests.exceptions.RequestException as e:
         logger.error(f"Error al obtener propiedades de la base de datos: {str(e)}")
@@ -73,6 +94,13 @@ def create_filter_condition(property_name: str, property_type: str, value: Any)
                 "equals": value
             }
         }
+    elif property_type == "status":
+        return {
+            "property": property_name,
+            "status": {
+                "equals": value
+            }
+        }
     elif property_type == "multi_select":
         return {
             "property": property_name,
@@ -108,6 +136,13 @@ def create_filter_condition(property_name: str, property_type: str, value: Any)
                 "contains": value
             }
         }
+    elif property_type == "date":
+        return {
+            "property": property_name,
+            "date": {
+                "equals": value
+            }
+        }
     elif property_type == "formula":
         return {
             "property": property_name,
@@ -119,53 +154,361 @@ def create_filter_condition(property_name: str, property_type: str, value: Any)
         logger.warning(f"Tipo de propiedad no soportado para filtrado: {property_type}")
         return {}
 
-def get_pages_with_filter(filters: List[Dict] = None, page_size: int = 100) -> List[Dict]:
-    all_pages = []
+# Tipos de propiedad que admiten al menos la igualdad en create_filter_condition
+FILTERABLE_PROPERTY_TYPES = ("select", "multi_select", "status", "title", "rich_text", "number", "checkbox", "people", "formula", "date")
+
+# Expresiones de filtro: hojas {"property", "op", "value"} y grupos {"and": [...]} / {"or": [...]}
+FILTER_OPERATORS = ("eq", "neq", "in", "not_in", "gt", "gte", "lt", "lte", "between", "empty", "not_empty")
+# Notion admite filtros compuestos anidados dos niveles bajo el filtro raíz
+NOTION_MAX_FILTER_DEPTH = 3
+
+_NEGATED_OPERATORS = {
+    "select": "does_not_equal",
+    "status": "does_not_equal",
+    "multi_select": "does_not_contain",
+    "title": "does_not_contain",
+    "rich_text": "does_not_contain",
+    "number": "does_not_equal",
+    "checkbox": "does_not_equal",
+    "people": "does_not_contain",
+    "relation": "does_not_contain",
+}
+_RANGE_OPERATORS = {
+    "number": {"gt": "greater_than", "gte": "greater_than_or_equal_to", "lt": "less_than", "lte": "less_than_or_equal_to"},
+    "date": {"gt": "after", "gte": "on_or_after", "lt": "before", "lte": "on_or_before"},
+}
+_EMPTY_FILTER_TYPES = {"select", "status", "multi_select", "title", "rich_text", "number", "date", "people", "relation"}
+
+def is_filter_expression(value: Any) -> bool:
+    # Los filtros antiguos son un dict plano {propiedad: valor}
+    if not isinstance(value, dict):
+        return False
+    return set(value) in ({"and"}, {"or"}) or ("property" in value and "op" in value)
+
+def _validate_filter_node(node: Any, path: str) -> None:
+    if not isinstance(node, dict):
+        raise ValueError(f"{path}: se esperaba un objeto")
+    for group in ("and", "or"):
+        if group in node:
+            children = node[group]
+            if len(node) != 1 or not isinstance(children, list) or not children:
+                raise ValueError(f"{path}: el grupo '{group}' debe ser una lista no vacía de condiciones")
+            for index, child in enumerate(children):
+                _validate_filter_node(child, f"{path}.{group}[{index}]")
+            return
+    
+    op = node.get("op", "eq")
+    value = node.get("value")
+    if not isinstance(node.get("property"), str) or not node["property"]:
+        raise ValueError(f"{path}: falta la propiedad")
+    if op not in FILTER_OPERATORS:
+        raise ValueError(f"{path}: operador desconocido '{op}'")
+    if op in ("in", "not_in") and (not isinstance(value, list) or not value):
+        raise ValueError(f"{path}: '{op}' necesita una lista de valores")
+    if op == "between" and (not isinstance(value, list) or len(value) != 2):
+        raise ValueError(f"{path}: 'between' necesita [mínimo, máximo]")
+    if op in ("eq", "neq", "gt", "gte", "lt", "lte") and value in (None, ""):
+        raise ValueError(f"{path}: falta el valor")
+
+def normalize_filter_expression(property_filters: Any) -> Optional[Dict]:
+    """
+    Devuelve la expresión de filtro validada. Un dict plano {propiedad: valor} (el formato
+    anterior) se convierte en un AND de igualdades. Lanza ValueError si la estructura no es válida.
+    """
+    if not property_filters:
+        return None
+    if not is_filter_expression(property_filters):
+        return {"and": [{"property": name, "op": "eq", "value": value} for name, value in property_filters.items()]}
+    _validate_filter_node(property_filters, "filtro")
+    return property_filters
+
+def filter_property_names(node: Any) -> List[str]:
+    # Propiedades usadas en una expresión o en un filtro de Notion, sin repetir y en orden
+    if not isinstance(node, dict):
+        return []
+    if "and" in node or "or" in node:
+        names = []
+        for child in node.get("and") or node.get("or") or []:
+            names.extend(name for name in filter_property_names(child) if name not in names)
+        return names
+    return [node["property"]] if node.get("property") else []
+
+def _filter_depth(node: Dict) -> int:
+    children = node.get("and") or node.get("or")
+    if children is None:
+        return 0
+    return 1 + max(_filter_depth(child) for child in children)
+
+def _coerce_filter_value(property_type: str, value: Any) -> Any:
+    # Los valores llegan como texto desde el formulario; Notion exige el tipo de la propiedad
+    if property_type == "number":
+        number = float(value)
+        return int(number) if number.is_integer() else number
+    if property_type == "checkbox":
+        return value if isinstance(value, bool) else str(value).strip().lower() in ("true", "1", "si", "sí", "on")
+    if property_type == "date":
+        datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        return str(value)
+    return value
+
+def _compile_filter_condition(name: str, op: str, value: Any, db_properties: Dict[str, Dict]) -> Dict:
+    if name not in db_properties:
+        raise ValueError(f"Propiedad '{name}' no encontrada en la base de datos")
+    prop_type = db_properties[name].get("type")
+    
+    # IN, NOT IN y rangos se reescriben como grupos de condiciones simples
+    if op == "in":
+        return _compile_filter_node({"or": [{"property": name, "op": "eq", "value": v} for v in value]}, db_properties)
+    if op == "not_in":
+        return _compile_filter_node({"and": [{"property": name, "op": "neq", "value": v} for v in value]}, db_properties)
+    if op == "between":
+        return _compile_filter_node({"and": [
+            {"property": name, "op": "gte", "value": value[0]},
+            {"property": name, "op": "lte", "value": value[1]},
+        ]}, db_properties)
+    
+    filter_key = "rich_text" if prop_type == "title" else prop_type
+    condition = {}
+    if op in ("empty", "not_empty"):
+        if prop_type in _EMPTY_FILTER_TYPES:
+            condition = {"property": name, filter_key: {"is_empty" if op == "empty" else "is_not_empty": True}}
+    else:
+        try:
+            value = _coerce_filter_value(prop_type, value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Valor '{value}' no válido para la propiedad '{name}' de tipo {prop_type}")
+        if op == "eq":
+            condition = create_filter_condition(name, prop_type, value)
+        elif op == "neq":
+            operator = _NEGATED_OPERATORS.get(prop_type)
+            if operator:
+                condition = {"property": name, filter_key: {operator: value}}
+        else:
+            operator = _RANGE_OPERATORS.get(prop_type, {}).get(op)
+            if operator:
+                condition = {"property": name, prop_type: {operator: value}}
+    
+    if not condition:
+        raise ValueError(f"El operador '{op}' no se admite para la propiedad '{name}' de tipo {prop_type}")
+    return condition
+
+def _compile_filter_node(node: Dict, db_properties: Dict[str, Dict]) -> Dict:
+    for group in ("and", "or"):
+        if group in node:
+            children = []
+            for child in node[group]:
+                compiled = _compile_filter_node(child, db_properties)
+                # a AND (b AND c) equivale a a AND b AND c: se ahorra un nivel de anidamiento
+                if set(compiled) == {group}:
+                    children.extend(compiled[group])
+                else:
+                    children.append(compiled)
+            return children[0] if len(children) == 1 else {group: children}
+    return _compile_filter_condition(node["property"], node.get("op", "eq"), node.get("value"), db_properties)
+
+def compile_filter_expression(expression: Dict, db_properties: Dict[str, Dict]) -> List[Dict]:
+    """
+    Compila una expresión de filtro a condiciones de Notion, que la consulta combina con
+    AND junto al filtro de fecha: toda la selección cuesta una sola consulta paginada.
+    Lanza ValueError si una propiedad no existe, un operador no se admite para su tipo
+    o el árbol supera el anidamiento que acepta Notion.
+    """
+    compiled = _compile_filter_node(expression, db_properties)
+    filters = compiled["and"] if set(compiled) == {"and"} else [compiled]
+    if _filter_depth({"and": filters}) > NOTION_MAX_FILTER_DEPTH:
+        raise ValueError(
+            f"La expresión de filtro anida demasiados grupos: Notion admite {NOTION_MAX_FILTER_DEPTH} niveles"
+        )
+    return filters
+
+def build_date_filter(start_date: datetime) -> Dict:
+    # Notion compara en UTC y las fechas del plan llevan su propio offset, mientras que el
+    # corte se evalúa sobre la hora local sin zona. Se amplía un día hacia atrás para no
+    # perder páginas por la diferencia horaria; el corte exacto se aplica al procesar.
+    cutoff = (start_date - timedelta(days=1)).date()
+    return {
+        "property": DATE_PROPERTY_NAME,
+        "date": {
+            "on_or_after": cutoff.isoformat()
+        }
+    }
+
+def _query_payload(filters: List[Dict], page_size: int, start_cursor: Optional[str]) -> Dict:
+    payload = {
+        "page_size": page_size,
+        # Orden estable por creación: los PATCH del mismo ajuste no reordenan el cursor
+        "sorts": [{"timestamp": "created_time", "direction": "ascending"}]
+    }
+    
+    # Añadir filtros si existen
+    if filters and len(filters) > 0:
+        if len(filters) == 1:
+            payload["filter"] = filters[0]
+        else:
+            payload["filter"] = {
+                "and": filters
+            }
+    
+    if start_cursor:
+        payload["start_cursor"] = start_cursor
+    return payload
+
+def iter_pages_with_filter(
+    filters: List[Dict] = None,
+    page_size: int = 100,
+    filter_properties: List[str] = None,
+    strict: bool = False
+) -> Iterator[Dict]:
+    """
+    Genera las páginas de la base de datos a medida que llega cada lote del cursor,
+    sin acumular la consulta completa en memoria. Si se indica `filter_properties`
+    (IDs de propiedad), Notion solo devuelve esas propiedades de cada página.
+    Con `strict=True` un error de la API se propaga en lugar de cortar la iteración.
+    """
+    params = [("filter_properties", prop_id) for prop_id in filter_properties or []]
     has_more = True
     start_cursor = None
+    fetched = 0
     
     while has_more:
         try:
-            url = f"{API_BASE_URL}/databases/{DATABASE_ID}/query"
-            payload = {
-                "page_size": page_size
-            }
-            
-            # Añadir filtros si existen
-            if filters and len(filters) > 0:
-                if len(filters) == 1:
-                    payload["filter"] = filters[0]
-                else:
-                    payload["filter"] = {
-                        "and": filters
-                    }
-            
-            if start_cursor:
-                payload["start_cursor"] = start_cursor
-                
-            response = requests.post(url, headers=HEADERS, json=payload, timeout=REQUEST_TIMEOUT)
+            payload = _query_payload(filters, page_size, start_cursor)
+            with phase("query_page"):
+                response = notion_http.post(
+                    f"/databases/{DATABASE_ID}/query", "databases.query", json=payload, params=params
+                )
             response.raise_for_status()
             data = response.json()
             
-            # Añadir resultados a la lista
             results = data.get("results", [])
-            all_pages.extend(results)
+            fetched += len(results)
             
             # Verificar si hay más páginas
             has_more = data.get("has_more", False)
             start_cursor = data.get("next_cursor")
             
-            logger.info(f"Obtenidas {len(results)} páginas con filtros. Total acumulado: {len(all_pages)}")
+            logger.debug("Obtenidas %d páginas con filtros. Total acumulado: %d", len(results), fetched)
             
         except requests.exceptions.RequestException as e:
             logger.error(f"Error al obtener páginas de Notion con filtros: {str(e)}")
+            if strict:
+                raise
             break
-            
-    return all_pages
+        
+        # Se cede fuera del try para que los errores del consumidor no se confundan con los de la API
+        yield from results
 
-def update_page(page_id: str, new_start: datetime, new_end: Optional[datetime]) -> Tuple[int, Dict]:
-    url = f"{API_BASE_URL}/pages/{page_id}"
-    
+def get_pages_with_filter(
+    filters: List[Dict] = None,
+    page_size: int = 100,
+    filter_properties: List[str] = None
+) -> List[Dict]:
+    return list(iter_pages_with_filter(filters, page_size, filter_properties))
+
+def resolve_property_ids(names: List[str], db_properties: Dict[str, Dict]) -> List[str]:
+    # filter_properties espera IDs de propiedad; si el esquema no trae el ID se usa el nombre
+    return [db_properties.get(name, {}).get("id") or name for name in dict.fromkeys(names)]
+
+class ScheduledPage:
+    """
+    Registro compacto de una página del plan: solo los campos que usa el ajuste.
+    `values` contiene los valores de las propiedades de filtro en el orden de `keys`.
+    """
+    __slots__ = ("id", "start", "end", "last_edited_time", "keys", "values")
+
+    def __init__(self, id: str, start: Optional[str], end: Optional[str],
+                 last_edited_time: Optional[str], keys: Tuple[str, ...] = (), values: Tuple[Any, ...] = ()):
+        self.id = id
+        self.start = start
+        self.end = end
+        self.last_edited_time = last_edited_time
+        self.keys = keys
+        self.values = values
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self.values[self.keys.index(key)]
+        except ValueError:
+            return default
+
+    def __repr__(self):
+        return f"<ScheduledPage {self.id} {self.start} -> {self.end}>"
+
+def property_plain_value(prop: Dict) -> Any:
+    """
+    Reduce el valor de una propiedad de Notion a un escalar (o tupla) comparable.
+    """
+    if not prop:
+        return None
+    prop_type = prop.get("type")
+    value = prop.get(prop_type)
+    if value is None:
+        return None
+    if prop_type in ("title", "rich_text"):
+        return "".join(part.get("plain_text", "") for part in value)
+    if prop_type in ("select", "status"):
+        return value.get("name")
+    if prop_type == "multi_select":
+        return tuple(option.get("name") for option in value)
+    if prop_type == "people":
+        return tuple(person.get("name") or person.get("id") for person in value)
+    if prop_type == "relation":
+        return tuple(item.get("id") for item in value)
+    if prop_type == "date":
+        return value.get("start")
+    if prop_type == "formula":
+        return value.get(value.get("type"))
+    if prop_type == "unique_id":
+        prefix = value.get("prefix")
+        return f"{prefix}-{value.get('number')}" if prefix else value.get("number")
+    if prop_type in ("number", "checkbox", "url", "email", "phone_number", "created_time", "last_edited_time"):
+        return value
+    return None
+
+def project_page(page: Dict, keys: Tuple[str, ...] = ()) -> ScheduledPage:
+    properties = page.get("properties", {})
+    date_info = (properties.get(DATE_PROPERTY_NAME) or {}).get("date") or {}
+    return ScheduledPage(
+        page.get("id"),
+        date_info.get("start"),
+        date_info.get("end"),
+        page.get("last_edited_time"),
+        keys,
+        tuple(property_plain_value(properties.get(key)) for key in keys)
+    )
+
+def iter_scheduled_pages(
+    filters: List[Dict] = None,
+    keys: Tuple[str, ...] = (),
+    page_size: int = 100,
+    filter_properties: List[str] = None,
+    strict: bool = False
+) -> Iterator[ScheduledPage]:
+    # Cada página se proyecta en cuanto se recibe; el JSON completo solo vive lo que dura su lote
+    keys = tuple(keys)
+    for page in iter_pages_with_filter(filters, page_size, filter_properties, strict):
+        yield project_page(page, keys)
+
+def iter_pages_edited_since(since: Optional[str], keys: Tuple[str, ...] = ()) -> Iterator[ScheduledPage]:
+    """
+    Páginas editadas en o después de `since` (ISO 8601), o todas si `since` es None.
+    Pensado para sincronizar una copia local: cualquier error de la API se propaga.
+    """
+    filters = []
+    if since:
+        # Notion redondea last_edited_time al minuto: on_or_after vuelve a traer el último minuto
+        filters.append({"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": since}})
+    db_properties = get_database_properties()
+    if not db_properties:
+        raise ConnectionError("No se pudo obtener el esquema de la base de datos de Notion")
+    filter_properties = resolve_property_ids([DATE_PROPERTY_NAME, *keys], db_properties)
+    yield from iter_scheduled_pages(filters, keys, filter_properties=filter_properties, strict=True)
+
+def parse_notion_datetime(value: str) -> datetime:
+    # Misma normalización que el ajuste: hora local del plan sin zona horaria
+    return datetime.fromisoformat(value).replace(tzinfo=None)
+
+def _date_update_payload(new_start: datetime, new_end: Optional[datetime]) -> Dict:
     # Preparar payload con fecha de inicio y posiblemente fecha de fin
     date_value = {
         "start": new_start.isoformat()
@@ -174,95 +517,574 @@ def update_page(page_id: str, new_start: datetime, new_end: Optional[datetime])
     if new_end:
         date_value["end"] = new_end.isoformat()
     
-    payload = {
+    return {
         "properties": {
             DATE_PROPERTY_NAME: {
                 "date": date_value
             }
         }
     }
+
+def update_page(page_id: str, new_start: datetime, new_end: Optional[datetime]) -> Tuple[int, Dict]:
+    payload = _date_update_payload(new_start, new_end)
     
     try:
-        response = requests.patch(url, json=payload, headers=HEADERS, timeout=REQUEST_TIMEOUT)
+        # El limitador compartido y los reintentos evitan perder actualizaciones por 429/5xx
+        with phase("patch"):
+            response = notion_http.patch(f"/pages/{page_id}", "pages.update", json=payload)
         response.raise_for_status()
-        logger.info(f"Página {page_id} actualizada correctamente")
-        return response.status_code, response.json()
+        logger.debug("Página %s actualizada correctamente", page_id)
+        # Notion devuelve la página completa; en caso de éxito no hace falta decodificarla
+        return response.status_code, {}
     except requests.exceptions.HTTPError as e:
-        logger.error(f"Error HTTP al actualizar página {page_id}: {str(e)}")
-        return e.response.status_code, e.response.json()
+        logger.error(f"Error HTTP al actualizar página {page_id}: {str(e)}", extra={"sample_key": "update_page"})
+        try:
+            error_body = e.response.json()
+        except ValueError:
+            error_body = {"error": e.response.text}
+        return e.response.status_code, error_body
     except requests.exceptions.RequestException as e:
-        logger.error(f"Error al actualizar página {page_id}: {str(e)}")
+        logger.error(f"Error al actualizar página {page_id}: {str(e)}", extra={"sample_key": "update_page"})
         return 500, {"error": str(e)}
 
-def adjust_dates_with_filters(
-    hours: int, 
-    start_date: datetime, 
-    filters: List[Dict[str, Any]] = None
-) -> str:
-    if not validate_api_connection():
-        return "Error: No se pudo conectar a la API de Notion. Verifica tu conexión y credenciales."
+# ---------------------------------------------------------------------------
+# Variantes asyncio: mismas peticiones sobre AsyncNotionHttpClient (pool y semáforo
+# compartidos), para lanzar muchas llamadas desde un solo bucle de eventos.
+# ---------------------------------------------------------------------------
+def async_notion_client(**kwargs) -> AsyncNotionHttpClient:
+    # Crear dentro del bucle que lo va a usar y cerrar con `async with` o `aclose()`
+    return AsyncNotionHttpClient(NOTION_API_KEY, API_BASE_URL, NOTION_VERSION, timeout=REQUEST_TIMEOUT, **kwargs)
+
+async def aiter_pages_with_filter(
+    client: AsyncNotionHttpClient,
+    filters: List[Dict] = None,
+    page_size: int = 100,
+    filter_properties: List[str] = None
+) -> AsyncIterator[Dict]:
+    """
+    Equivalente asyncio de `iter_pages_with_filter` (siempre estricto: los errores de la
+    API se propagan). El cursor es secuencial, pero no bloquea el bucle mientras espera.
+    """
+    params = [("filter_properties", prop_id) for prop_id in filter_properties or []]
+    has_more = True
+    start_cursor = None
     
-    # Obtener páginas con los filtros aplicados
-    pages = get_pages_with_filter(filters)
-    total_pages = len(pages)
+    while has_more:
+        with phase("query_page"):
+            response = await client.post(
+                f"/databases/{DATABASE_ID}/query", "databases.query",
+                json=_query_payload(filters, page_size, start_cursor), params=params
+            )
+        response.raise_for_status()
+        data = response.json()
+        has_more = data.get("has_more", False)
+        start_cursor = data.get("next_cursor")
+        for page in data.get("results", []):
+            yield page
+
+async def get_pages_with_filter_async(
+    client: AsyncNotionHttpClient,
+    filters: List[Dict] = None,
+    page_size: int = 100,
+    filter_properties: List[str] = None
+) -> List[Dict]:
+    return [page async for page in aiter_pages_with_filter(client, filters, page_size, filter_properties)]
+
+async def update_page_async(
+    client: AsyncNotionHttpClient,
+    page_id: str,
+    new_start: datetime,
+    new_end: Optional[datetime]
+) -> Tuple[int, Dict]:
+    payload = _date_update_payload(new_start, new_end)
+    
+    try:
+        with phase("patch"):
+            response = await client.patch(f"/pages/{page_id}", "pages.update", json=payload)
+        response.raise_for_status()
+        logger.debug("Página %s actualizada correctamente", page_id)
+        return response.status_code, {}
+    except httpx.HTTPStatusError as e:
+        logger.error(f"Error HTTP al actualizar página {page_id}: {str(e)}", extra={"sample_key": "update_page"})
+        try:
+            error_body = e.response.json()
+        except ValueError:
+            error_body = {"error": e.response.text}
+        return e.response.status_code, error_body
+    except httpx.HTTPError as e:
+        logger.error(f"Error al actualizar página {page_id}: {str(e)}", extra={"sample_key": "update_page"})
+        return 500, {"error": str(e)}
+
+# Resultado de _safe_update_page cuando la página ya no tiene la fecha esperada (no es un código HTTP)
+PAGE_CHANGED = -1
+
+class PlannedUpdate:
+    """
+    Cambio de fechas decidido para una página: fechas originales (ISO tal como las
+    guarda Notion) y fechas nuevas a escribir. Con `verify=True` (reversiones) el PATCH
+    solo se envía si la página sigue en `original_start`.
+    """
+    __slots__ = ("page_id", "original_start", "original_end", "new_start", "new_end", "verify")
+
+    def __init__(self, page_id: str, original_start: Optional[str], original_end: Optional[str],
+                 new_start: datetime, new_end: Optional[datetime], verify: bool = False):
+        self.page_id = page_id
+        self.original_start = original_start
+        self.original_end = original_end
+        self.new_start = new_start
+        self.new_end = new_end
+        self.verify = verify
+
+    def __repr__(self):
+        return f"<PlannedUpdate {self.page_id} {self.original_start} -> {self.new_start.isoformat()}>"
+
+def get_page_dates(page_id: str) -> ScheduledPage:
+    # Lectura de una sola página, limitada a la propiedad de fecha
+    filter_properties = resolve_property_ids([DATE_PROPERTY_NAME], get_database_properties())
+    with phase("query_page"):
+        response = notion_http.get(f"/pages/{page_id}", "pages.retrieve", params={"filter_properties": filter_properties})
+    response.raise_for_status()
+    return project_page(response.json())
+
+def _page_unchanged(plan: PlannedUpdate) -> bool:
+    # Sigue en la fecha que dejó el ajuste, o ya tiene la de destino (reanudación tras una caída)
+    current = get_page_dates(plan.page_id).start
+    if not current or not plan.original_start:
+        return False
+    current = parse_notion_datetime(current)
+    return current in (parse_notion_datetime(plan.original_start), plan.new_start.replace(tzinfo=None))
+
+def _safe_update_page(plan: PlannedUpdate) -> int:
+    # Envoltura para los hilos del pool: cualquier excepción cuenta como actualización fallida
+    try:
+        if plan.verify and not _page_unchanged(plan):
+            return PAGE_CHANGED
+        status_code, _ = update_page(plan.page_id, plan.new_start, plan.new_end)
+        return status_code
+    except Exception as e:
+        logger.error(f"Error inesperado al actualizar página {plan.page_id}: {str(e)}", extra={"sample_key": "update_page"})
+        return 500
+
+def _plan_page_update(page: ScheduledPage, hours: int, start_date: datetime, verify: bool = False) -> Union[PlannedUpdate, str]:
+    """
+    Calcula las nuevas fechas de una página. Devuelve un PlannedUpdate, o "skip"
+    si la página no se mueve, o "error" si sus fechas no se pueden interpretar.
+    Con `verify` el PATCH solo se envía si la página sigue en `page.start`.
+    """
+    page_id = page.id
+    
+    if not page_id:
+        logger.warning("Página sin ID encontrada, omitiendo")
+        return "skip"
+        
+    if not page.start:
+        logger.debug("Página %s sin fecha, omitiendo", page_id)
+        return "skip"
+        
+    try:
+        # Conversión a datetime sin zona horaria
+        start_date_notion = parse_notion_datetime(page.start)
+        end_date_notion = None
+        
+        if page.end:
+            end_date_notion = parse_notion_datetime(page.end)
+            
+        # Mover solo los horarios que sean iguales o posteriores a start_date
+        if start_date_notion < start_date:
+            # Solo llegan aquí las páginas del margen de un día de build_date_filter
+            logger.debug("Página %s con fecha anterior a %s, omitiendo", page_id, start_date)
+            return "skip"
+            
+        new_start = start_date_notion + timedelta(hours=hours)
+        new_end = end_date_notion + timedelta(hours=hours) if end_date_notion else None
+        return PlannedUpdate(page_id, page.start, page.end, new_start, new_end, verify=verify)
+            
+    except (ValueError, TypeError) as e:
+        logger.error(f"Error al procesar fecha de página {page_id}: {str(e)}", extra={"sample_key": "parse_date"})
+        return "error"
+
+def plan_date_shift(pages: Iterable[ScheduledPage], hours: int, start_date: datetime,
+                    verify: bool = False) -> Iterator[Union[PlannedUpdate, str]]:
+    for page in pages:
+        yield _plan_page_update(page, hours, start_date, verify)
+
+def iter_target_pages(start_date: datetime, filters: List[Dict[str, Any]] = None, strict: bool = False) -> Iterator[ScheduledPage]:
+    """
+    Páginas candidatas a moverse, consultadas en Notion en una sola pasada paginada.
+    """
+    db_properties = get_database_properties()
+    # El corte por fecha viaja en la misma consulta que los filtros de propiedades
+    query_filters = list(filters or []) + [build_date_filter(start_date)]
+    filter_keys = tuple(filter_property_names({"and": filters or []}))
+    # Solo se piden a Notion la fecha y las propiedades de filtro
+    filter_properties = resolve_property_ids([DATE_PROPERTY_NAME, *filter_keys], db_properties)
+    return iter_scheduled_pages(query_filters, filter_keys, filter_properties=filter_properties, strict=strict)
+
+def resume_planned_updates(plans: Iterable[Union[PlannedUpdate, str]], journal: Any) -> Iterator[Union[PlannedUpdate, str]]:
+    """
+    Reanudación de un ajuste interrumpido: primero se reaplican las entradas del diario
+    que no terminaron (a sus fechas nuevas absolutas, por lo que repetirlas no desplaza
+    dos veces) y después se continúa con la selección sin las páginas ya anotadas.
+    """
+    yield from journal.unfinished()
+    for plan in plans:
+        if isinstance(plan, PlannedUpdate) and journal.contains(plan.page_id):
+            continue
+        yield plan
+
+def apply_planned_updates(
+    plans: Iterable[Union[PlannedUpdate, str]],
+    max_workers: int = MAX_CONCURRENT_UPDATES,
+    journal: Any = None,
+    on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    expected_total: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Motor de actualización: envía en paralelo un PATCH por cada PlannedUpdate
+    ("skip" y "error" solo se cuentan) y devuelve los contadores finales. Los planes
+    con `verify` cuya página cambió desde el ajuste no se envían: se cuentan en
+    `changed` y sus IDs se devuelven en `changed_pages`.
+
+    Si se pasa `journal`, cada lote se anota con `journal.begin(plans)` antes de enviar
+    sus PATCH y cada resultado con `journal.finish(plan, ok)`; `journal.flush()` se llama
+    al terminar. `on_progress` recibe un evento de progreso cada vez que cambian los
+    contadores. Todas estas llamadas se hacen desde el hilo que llama a esta función.
+    """
+    total_pages = 0
     updated_pages = 0
     failed_updates = 0
     skipped_pages = 0
+    changed_pages: List[str] = []
     
-    # Construir descripción de filtros para el log
-    filter_description = "ninguno"
-    if filters and len(filters) > 0:
-        filter_props = [f.get("property", "desconocido") for f in filters]
-        filter_description = ", ".join(filter_props)
+    # Las páginas se consumen a medida que llega cada lote de la consulta y los PATCH se
+    # envían mientras se descarga el siguiente. Como mucho hay `max_in_flight` PATCH
+    # pendientes: al alcanzarlo se deja de leer el cursor hasta que termine alguno.
+    workers = max(1, max_workers)
+    max_in_flight = workers * 2
+    batch_size = JOURNAL_BATCH_SIZE if journal is not None else max_in_flight
+    in_flight: Dict[Any, PlannedUpdate] = {}
+    batch: List[PlannedUpdate] = []
     
-    logger.info(f"Iniciando ajuste de fechas: {hours} horas a partir de {start_date.isoformat()}")
-    logger.info(f"Filtros aplicados: {filter_description}")
-    logger.info(f"Total de páginas a procesar: {total_pages}")
+    started_at = time.monotonic()
+    logged_at = started_at
+    fetching = True
     
-    for page in pages:
-        properties = page.get("properties", {})
-        page_id = page.get("id")
-        
-        if not page_id:
-            logger.warning("Página sin ID encontrada, omitiendo")
-            skipped_pages += 1
-            continue
+    def report() -> None:
+        nonlocal logged_at
+        now = time.monotonic()
+        if now - logged_at >= LOG_PROGRESS_INTERVAL:
+            # Una línea agregada por intervalo en lugar de una por página
+            logged_at = now
+            logger.info(
+                f"Progreso: {total_pages} páginas leídas, {updated_pages} actualizadas, "
+                f"{failed_updates} fallidas, {skipped_pages} omitidas, {len(changed_pages)} modificadas en Notion, "
+                f"{len(in_flight)} en curso"
+            )
+        if not on_progress:
+            return
+        elapsed = time.monotonic() - started_at
+        completed = updated_pages + failed_updates + len(changed_pages)
+        rate = completed / elapsed if elapsed > 0 else 0.0
+        # Sin total conocido solo se estima el tiempo restante cuando ya se leyó toda la consulta
+        if expected_total is not None:
+            remaining = max(0, expected_total - total_pages) + len(batch) + len(in_flight)
+        elif not fetching:
+            remaining = len(batch) + len(in_flight)
+        else:
+            remaining = None
+        eta = round(remaining / rate, 1) if remaining is not None and rate > 0 else None
+        on_progress({
+            "fetched": total_pages,
+            "total": expected_total if fetching else total_pages,
+            "updated": updated_pages,
+            "failed": failed_updates,
+            "skipped": skipped_pages,
+            "changed": len(changed_pages),
+            "in_flight": len(in_flight),
+            "rate": round(rate, 2),
+            "eta_seconds": 0.0 if remaining == 0 else eta,
+            "done": not fetching and not in_flight and not batch,
+        })
+    
+    def collect(done) -> None:
+        nonlocal updated_pages, failed_updates
+        for future in done:
+            plan = in_flight.pop(future)
+            status_code = future.result()
+            ok = 200 <= status_code < 300
+            if status_code == PAGE_CHANGED:
+                # La página no se toca; en el diario queda como no actualizada
+                logger.warning("Página %s modificada desde el ajuste, no se restaura", plan.page_id, extra={"sample_key": "page_changed"})
+                changed_pages.append(plan.page_id)
+                PAGES_PROCESSED.inc(result="changed")
+            elif ok:
+                updated_pages += 1
+                PAGES_PROCESSED.inc(result="updated")
+            else:
+                failed_updates += 1
+                PAGES_PROCESSED.inc(result="failed")
+            if journal is not None:
+                journal.finish(plan, ok)
+        report()
+    
+    def dispatch(executor) -> None:
+        # El diario registra el lote antes de que salga cualquier PATCH (write-ahead)
+        if journal is not None:
+            journal.begin(batch)
+        for plan in batch:
+            if len(in_flight) >= max_in_flight:
+                done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                collect(done)
+            in_flight[executor.submit(_safe_update_page, plan)] = plan
+        batch.clear()
+    
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="notion-update") as executor:
+            for plan in plans:
+                total_pages += 1
+                if plan == "skip":
+                    skipped_pages += 1
+                    PAGES_PROCESSED.inc(result="skipped")
+                elif plan == "error":
+                    failed_updates += 1
+                    PAGES_PROCESSED.inc(result="invalid")
+                else:
+                    batch.append(plan)
+                    if len(batch) >= batch_size:
+                        dispatch(executor)
             
-        # Obtener información de fecha con navegación segura
-        date_info = properties.get(DATE_PROPERTY_NAME, {}).get("date", {})
+            fetching = False
+            dispatch(executor)
+            for future in as_completed(list(in_flight)):
+                collect((future,))
+            report()
+    finally:
+        if journal is not None:
+            journal.flush()
+    
+    return {
+        "total": total_pages,
+        "updated": updated_pages,
+        "failed": failed_updates,
+        "skipped": skipped_pages,
+        "changed": len(changed_pages),
+        "changed_pages": changed_pages,
+    }
+
+def plan_batch_shift(operations: List[Dict[str, Any]]) -> Iterator[Union[PlannedUpdate, str]]:
+    """
+    Combina varias operaciones de ajuste en un solo plan por página. Cada operación es
+    un dict con `hours`, `start_date` (datetime), `filters` y opcionalmente `pages` ya
+    seleccionadas. Cada operación se evalúa contra las fechas originales (el orden de
+    las operaciones no importa) y las horas de todas las que seleccionan una página se
+    suman: la página recibe un único PATCH con el desplazamiento neto, o ninguno si es 0.
+    """
+    selected: Dict[str, List[Any]] = {} # page_id -> [ScheduledPage, horas netas]
+    seen = set()
+    errors = set()
+    for operation in operations:
+        pages = operation.get("pages")
+        if pages is None:
+            # Un error de la consulta hace fallar el lote (reanudable) en vez de darlo por terminado
+            pages = iter_target_pages(operation["start_date"], operation.get("filters"), strict=True)
+        for page in pages:
+            seen.add(page.id)
+            plan = _plan_page_update(page, operation["hours"], operation["start_date"])
+            if plan == "error":
+                errors.add(page.id)
+            elif plan != "skip":
+                selected.setdefault(page.id, [page, 0])[1] += operation["hours"]
+    
+    for page_id in seen:
+        if page_id in selected and selected[page_id][1] != 0:
+            page, net_hours = selected[page_id]
+            # La fecha de corte ya se aplicó por operación
+            yield _plan_page_update(page, net_hours, datetime.min)
+        elif page_id in errors:
+            yield "error"
+        else:
+            yield "skip"
+
+def adjust_dates_batch_api(
+    operations: List[Dict[str, Any]],
+    on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    journal: Any = None,
+    resume: bool = False
+) -> Dict[str, Any]:
+    """
+    Aplica varias operaciones (`hours`, `start_date` como cadena, `property_filters` y
+    opcionalmente `pages`) con un solo PATCH por página afectada (ver `plan_batch_shift`).
+    """
+    try:
+        if not get_database_properties():
+            return {"success": False, "error": "No se pudo conectar a la API de Notion. Verifica tu conexión y credenciales."}
         
-        if not date_info or "start" not in date_info:
-            logger.info(f"Página {page_id} sin fecha, omitiendo")
-            skipped_pages += 1
+        planned_operations = []
+        for position, operation in enumerate(operations, start=1):
+            property_filters = operation.get("property_filters")
+            try:
+                filters = build_filter_from_properties(property_filters) if property_filters else None
+            except ValueError as e:
+                error_msg = f"Filtro inválido en la operación {position}: {str(e)}"
+                logger.error(error_msg)
+                return {"success": False, "error": error_msg}
+            planned_operations.append({
+                "hours": operation["hours"],
+                "start_date": datetime.fromisoformat(operation["start_date"].replace('Z', '+00:00')),
+                "filters": filters,
+                "pages": operation.get("pages"),
+            })
+            logger.info(
+                f"Operación de lote: {operation['hours']} horas a partir de {operation['start_date']}, "
+                f"filtros: {describe_filters(planned_operations[-1]['filters'])}"
+            )
+        
+        plans = plan_batch_shift(planned_operations)
+        if resume and journal is not None:
+            plans = resume_planned_updates(plans, journal)
+        counters = apply_planned_updates(plans, MAX_CONCURRENT_UPDATES, journal, on_progress)
+        
+    except ValueError as e:
+        error_msg = f"Formato de fecha inválido: {str(e)}"
+        logger.error(error_msg)
+        return {"success": False, "error": error_msg}
+    except Exception as e:
+        error_msg = f"Error al ajustar fechas en lote: {str(e)}"
+        logger.error(error_msg)
+        return {"success": False, "error": error_msg}
+    
+    logger.info(f"Lote completado: {counters['updated']} páginas actualizadas, {counters['failed']} fallidas, {counters['skipped']} omitidas")
+    resumen = (
+        f"Operación completada: Se actualizaron {counters['updated']} registros con {len(operations)} operaciones combinadas.\n"
+        f"Total de registros seleccionados: {counters['total']}\n"
+        f"Registros actualizados: {counters['updated']}\n"
+        f"Registros omitidos (sin desplazamiento neto): {counters['skipped']}\n"
+        f"Actualizaciones fallidas: {counters['failed']}"
+    )
+    return {"success": True, "message": resumen}
+
+def _describe_changed_pages(changed_pages: List[str]) -> str:
+    if not changed_pages:
+        return ""
+    listed = changed_pages[:CHANGED_PAGES_REPORT_LIMIT]
+    more = len(changed_pages) - len(listed)
+    return "\nPáginas modificadas: " + ", ".join(listed) + (f" y {more} más" if more else "")
+
+def plan_rollback(
+    entries: Iterable[Tuple[str, Optional[str], Optional[str], str, Optional[str]]]
+) -> Iterator[Union[PlannedUpdate, str]]:
+    """
+    Planes inversos de un ajuste a partir de su diario. Cada entrada es
+    (page_id, original_start, original_end, applied_start, applied_end); la página
+    vuelve a sus fechas originales exactas, con la zona horaria que tenían en Notion,
+    solo si su fecha actual sigue siendo `applied_start` (ver `_page_unchanged`).
+    """
+    for page_id, original_start, original_end, applied_start, applied_end in entries:
+        if not original_start:
+            yield "skip"
             continue
-            
         try:
-            # Conversión a datetime sin zona horaria
-            start_date_notion = datetime.fromisoformat(date_info["start"]).replace(tzinfo=None)
-            end_date_notion = None
-            
-            if date_info.get("end"):
-                end_date_notion = datetime.fromisoformat(date_info["end"]).replace(tzinfo=None)
-                
-            # Mover solo los horarios que sean iguales o posteriores a start_date
-            if start_date_notion >= start_date:
-                new_start = start_date_notion + timedelta(hours=hours)
-                new_end = end_date_notion + timedelta(hours=hours) if end_date_notion else None
-                
-                status_code, _ = update_page(page_id, new_start, new_end)
-                
-                if 200 <= status_code < 300:
-                    updated_pages += 1
-                else:
-                    failed_updates += 1
-            else:
-                logger.info(f"Página {page_id} con fecha anterior a {start_date.isoformat()}, omitiendo")
-                skipped_pages += 1
-                
-        except (ValueError, TypeError) as e:
-            logger.error(f"Error al procesar fecha de página {page_id}: {str(e)}")
-            failed_updates += 1
+            yield PlannedUpdate(
+                page_id, applied_start, applied_end,
+                datetime.fromisoformat(original_start.replace('Z', '+00:00')),
+                datetime.fromisoformat(original_end.replace('Z', '+00:00')) if original_end else None,
+                verify=True
+            )
+        except ValueError as e:
+            logger.error(f"Fecha original inválida en el diario para la página {page_id}: {str(e)}")
+            yield "error"
+
+def rollback_date_adjustment(
+    entries: Iterable[Tuple[str, Optional[str], Optional[str], str, Optional[str]]],
+    on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    journal: Any = None,
+    resume: bool = False
+) -> Dict[str, Any]:
+    """
+    Deshace un ajuste restaurando las fechas originales de las páginas que cambió
+    (`entries`, ver `plan_rollback`). No consulta la base de datos: el coste es
+    proporcional a las páginas del ajuste. Usa el mismo motor paralelo y limitado
+    que el ajuste, así que `journal`, `resume` y `on_progress` funcionan igual.
+    """
+    expected_total = len(entries) if isinstance(entries, Sized) else None
+    plans = plan_rollback(entries)
+    if resume and journal is not None:
+        plans = resume_planned_updates(plans, journal)
+        expected_total = None
     
+    try:
+        counters = apply_planned_updates(plans, MAX_CONCURRENT_UPDATES, journal, on_progress, expected_total)
+    except Exception as e:
+        error_msg = f"Error al revertir el ajuste: {str(e)}"
+        logger.error(error_msg)
+        return {"success": False, "error": error_msg}
+    
+    logger.info(
+        f"Reversión completada: {counters['updated']} páginas restauradas, {counters['failed']} fallidas, "
+        f"{counters['changed']} modificadas desde el ajuste"
+    )
+    resumen = (
+        f"Reversión completada: Se restauraron {counters['updated']} registros a sus fechas originales.\n"
+        f"Total de registros del ajuste: {counters['total']}\n"
+        f"Registros omitidos: {counters['skipped']}\n"
+        f"Registros no restaurados por haberse modificado desde el ajuste: {counters['changed']}\n"
+        f"Restauraciones fallidas: {counters['failed']}"
+    )
+    resumen += _describe_changed_pages(counters['changed_pages'])
+    return {"success": True, "message": resumen, "changed_pages": counters['changed_pages']}
+
+def describe_filters(filters: List[Dict[str, Any]] = None) -> str:
+    # Construir descripción de filtros para el log
+    if filters and len(filters) > 0:
+        filter_props = filter_property_names({"and": filters}) or ["desconocido"]
+        return ", ".join(filter_props)
+    return "ninguno"
+
+def adjust_dates_with_filters(
+    hours: int, 
+    start_date: datetime, 
+    filters: List[Dict[str, Any]] = None,
+    max_workers: int = MAX_CONCURRENT_UPDATES,
+    pages: Optional[Iterable[ScheduledPage]] = None,
+    on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    journal: Any = None,
+    resume: bool = False,
+    verify: bool = False
+) -> str:
+    """
+    Desplaza `hours` horas las páginas con fecha igual o posterior a `start_date`.
+    Si se pasa `pages` (por ejemplo, seleccionadas desde la copia local) no se consulta
+    Notion para elegirlas; `filters` se usa entonces solo para describir el ajuste.
+    Con `verify=True` (páginas de una vista previa confirmada) se omiten las páginas cuya
+    fecha cambió desde que se leyeron: sus fechas nuevas se calcularon sobre la antigua.
+    `journal` y `on_progress` se describen en `apply_planned_updates`; con `resume=True`
+    el ajuste continúa uno anterior a partir de su diario (`resume_planned_updates`).
+    """
+    # El esquema sirve a la vez de comprobación de conexión y de mapa nombre -> ID de propiedad
+    db_properties = get_database_properties()
+    if not db_properties:
+        return "Error: No se pudo conectar a la API de Notion. Verifica tu conexión y credenciales."
+    
+    filter_description = describe_filters(filters)
+    logger.info(f"Iniciando ajuste de fechas: {hours} horas a partir de {start_date.isoformat()}")
+    logger.info(f"Filtros aplicados: {filter_description}")
+    
+    expected_total = len(pages) if isinstance(pages, Sized) else None
+    if pages is None:
+        # Estricto: si la consulta falla a mitad, el trabajo termina 'failed' y se puede reanudar
+        pages = iter_target_pages(start_date, filters, strict=True)
+    plans = plan_date_shift(pages, hours, start_date, verify)
+    if resume and journal is not None:
+        plans = resume_planned_updates(plans, journal)
+        expected_total = None
+    
+    counters = apply_planned_updates(plans, max_workers, journal, on_progress, expected_total)
+    total_pages = counters["total"]
+    updated_pages = counters["updated"]
+    failed_updates = counters["failed"]
+    skipped_pages = counters["skipped"]
+    
+    logger.info(f"Total de páginas procesadas: {total_pages}")
     logger.info(f"Proceso completado: {updated_pages} páginas actualizadas, {failed_updates} fallidas, {skipped_pages} omitidas")
     
     # Crear un mensaje de resumen formateado como string
@@ -275,21 +1097,71 @@ def adjust_dates_with_filters(
         f"Actualizaciones fallidas: {failed_updates}\n"
         f"Ajuste aplicado: {hours} horas"
     )
+    if verify:
+        resumen += (
+            f"\nRegistros no movidos por haberse modificado desde la vista previa: {counters['changed']}"
+            + _describe_changed_pages(counters['changed_pages'])
+        )
     
     return resumen
 
+def preview_date_adjustment(
+    hours: int,
+    start_date: datetime,
+    filters: List[Dict[str, Any]] = None,
+    pages: Optional[Iterable[ScheduledPage]] = None
+) -> Dict[str, Any]:
+    """
+    Simulación del ajuste: misma selección y aritmética de fechas que
+    `adjust_dates_with_filters`, en una sola pasada y sin ningún PATCH.
+    Devuelve las páginas que se moverían (`pages`), sus fechas antiguas y nuevas
+    (`rows`) y cuántas se omitirían o tienen fechas inválidas.
+    """
+    if pages is None:
+        pages = iter_target_pages(start_date, filters, strict=True)
+    
+    selected, rows = [], []
+    skipped = errors = 0
+    for page in pages:
+        plan = _plan_page_update(page, hours, start_date)
+        if plan == "skip":
+            skipped += 1
+        elif plan == "error":
+            errors += 1
+        else:
+            selected.append(page)
+            rows.append({
+                "page_id": plan.page_id,
+                "old_start": plan.original_start,
+                "old_end": plan.original_end,
+                "new_start": plan.new_start.isoformat(),
+                "new_end": plan.new_end.isoformat() if plan.new_end else None,
+            })
+    
+    return {"pages": selected, "rows": rows, "skipped": skipped, "errors": errors}
+
 def build_filter_from_properties(property_filters: Dict[str, Any]) -> List[Dict]:
     if not property_filters:
         return []
         
     filters = []
     db_properties = get_database_properties()
+    expression = property_filters if is_filter_expression(property_filters) else None
+    property_names = filter_property_names(expression) if expression else list(property_filters)
+    
+    # Una propiedad desconocida puede ser nueva: se refresca el esquema una sola vez. Si el
+    # refresco falla se conserva el esquema en caché, que sigue siendo válido
+    if any(prop_name not in db_properties for prop_name in property_names):
+        db_properties = get_database_properties(force_refresh=True) or db_properties
+    
+    if expression:
+        # En una expresión no se omite nada: quitar una condición de un OR ampliaría la selección
+        return compile_filter_expression(normalize_filter_expression(expression), db_properties)
     
     for prop_name, prop_value in property_filters.items():
-        # Verificar si la propiedad existe en la base de datos
+        # Omitir un filtro ampliaría la selección a páginas que el usuario no pidió mover
         if prop_name not in db_properties:
-            logger.warning(f"Propiedad '{prop_name}' no encontrada en la base de datos, omitiendo filtro")
-            continue
+            raise ValueError(f"Propiedad '{prop_name}' no encontrada en la base de datos")
             
         # Obtener el tipo de propiedad
         prop_info = db_properties[prop_name]
@@ -297,26 +1169,43 @@ def build_filter_from_properties(property_filters: Dict[str, Any]) -> List[Dict]
         
         # Crear filtro según el tipo de propiedad
         filter_condition = create_filter_condition(prop_name, prop_type, prop_value)
+        if not filter_condition:
+            raise ValueError(f"La propiedad '{prop_name}' de tipo {prop_type} no admite filtros")
         
-        if filter_condition:
-            filters.append(filter_condition)
+        filters.append(filter_condition)
         
     return filters
 
 def adjust_dates_api(
     hours: int, 
     start_date_str: str, 
-    property_filters: Dict[str, Any] = None
+    property_filters: Dict[str, Any] = None,
+    pages: Optional[Iterable[ScheduledPage]] = None,
+    on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    journal: Any = None,
+    resume: bool = False,
+    verify: bool = False
 ) -> Dict[str, Any]:
     try:
         # Convertir string a datetime
         start_date = datetime.fromisoformat(start_date_str.replace('Z', '+00:00'))
         
         # Construir filtros si se proporcionaron
-        filters = build_filter_from_properties(property_filters) if property_filters else None
+        try:
+            filters = build_filter_from_properties(property_filters) if property_filters else None
+        except ValueError as e:
+            error_msg = f"Filtro inválido: {str(e)}"
+            logger.error(error_msg)
+            return {
+                "success": False,
+                "error": error_msg
+            }
         
         # Ejecutar el ajuste de fechas con filtros
-        result_message = adjust_dates_with_filters(hours, start_date, filters)
+        result_message = adjust_dates_with_filters(
+            hours, start_date, filters, pages=pages, on_progress=on_progress, journal=journal, resume=resume,
+            verify=verify
+        )
         
         # Construir respuesta para API
         return {
@@ -339,16 +1228,23 @@ def adjust_dates_api(
             "error": error_msg
         }
 
-def list_available_properties() -> List[Dict[str, str]]:
+def list_available_properties() -> List[Dict[str, Any]]:
+    # Sale del esquema en caché: no cuesta una petición a Notion mientras no caduque
     properties = get_database_properties()
     property_list = []
     
     for name, info in properties.items():
         prop_type = info.get("type", "unknown")
-        property_list.append({
+        prop = {
             "name": name,
-            "type": prop_type
-        })
+            "type": prop_type,
+            "filterable": prop_type in FILTERABLE_PROPERTY_TYPES
+        }
+        # Las opciones de select/multi_select/status vienen en el propio esquema
+        options = (info.get(prop_type) or {}).get("options") if isinstance(info.get(prop_type), dict) else None
+        if options is not None:
+            prop["options"] = [option.get("name") for option in options if option.get("name")]
+        property_list.append(prop)
         
     return property_list
 
@@ -386,3 +1282,14 @@ if __name__ == "__main__":
     })
     result3 = adjust_dates_with_filters(hours=2, start_date=today_midnight, filters=filters)
     print(result3)
+    
+    print("\n")
+    
+    # Ejemplo 4: Expresión compuesta (varios clientes, excepto un departamento) en una sola consulta
+    print("Ejemplo 4: Ajustar con una expresión de filtro")
+    filters = build_filter_from_properties({"and": [
+        {"property": "Cliente", "op": "in", "value": ["Empresa ABC", "Empresa XYZ"]},
+        {"property": "For - Código de departamento", "op": "neq", "value": "MAQ"},
+    ]})
+    result4 = adjust_dates_with_filters(hours=2, start_date=today_midnight, filters=filters)
+    print(result4)
@@ -0,0 +1,448 @@
+import os
+import time
+import asyncio
+import random
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import httpx
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+from notion_client.errors import HTTPResponseError, RequestTimeoutError
+
+from metrics import NOTION_RATE_LIMIT_WAIT, NOTION_REQUEST_SECONDS, NOTION_REQUESTS, NOTION_RETRIES
+
+logger = logging.getLogger("notion_integration")
+
+# Límite documentado por Notion: ~3 peticiones por segundo en promedio por integración
+NOTION_RATE_LIMIT = float(os.getenv("NOTION_RATE_LIMIT", "3"))
+NOTION_BURST = int(os.getenv("NOTION_BURST", "6"))
+
+# Presupuesto por endpoint (peticiones por segundo). Ninguno puede acaparar el límite global
+# y la validación/lectura de esquema nunca compite con los PATCH de un ajuste grande.
+ENDPOINT_BUDGETS = {
+    "databases.retrieve": 1.0,
+    "databases.query": 2.0,
+    "pages.retrieve": 2.0,
+    "pages.update": NOTION_RATE_LIMIT,
+    "pages.create": NOTION_RATE_LIMIT,
+}
+
+# Códigos HTTP que Notion documenta como transitorios
+RETRYABLE_STATUS_CODES = {409, 429, 500, 502, 503, 504}
+MAX_RETRIES = int(os.getenv("NOTION_MAX_RETRIES", "5"))
+
+# Conexiones keep-alive que conserva el pool HTTP hacia api.notion.com
+NOTION_POOL_SIZE = int(os.getenv("NOTION_POOL_SIZE", "10"))
+# Peticiones en vuelo que admite a la vez el cliente asyncio (el limitador sigue marcando el ritmo)
+NOTION_ASYNC_MAX_IN_FLIGHT = int(os.getenv("NOTION_ASYNC_MAX_IN_FLIGHT", "100"))
+
+
+class TokenBucket:
+    """
+    Cubeta de tokens thread-safe: `rate` tokens por segundo con capacidad `capacity`.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        # Reserva un token y devuelve cuánto hay que esperar para poder usarlo
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self) -> None:
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+
+class RateLimiter:
+    """
+    Limitador compartido: una cubeta global más una cubeta por endpoint.
+    Un 429 con Retry-After pausa a todos los hilos que usan el limitador.
+    """
+
+    def __init__(self, rate: float = NOTION_RATE_LIMIT, burst: int = NOTION_BURST,
+                 endpoint_budgets: Optional[Dict[str, float]] = None):
+        self._global = TokenBucket(rate, burst)
+        self._budgets = dict(ENDPOINT_BUDGETS if endpoint_budgets is None else endpoint_budgets)
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+        self._paused_until = 0.0
+
+    def _bucket_for(self, endpoint: str) -> Optional[TokenBucket]:
+        budget = self._budgets.get(endpoint)
+        if not budget:
+            return None
+        with self._lock:
+            bucket = self._buckets.get(endpoint)
+            if bucket is None:
+                bucket = self._buckets[endpoint] = TokenBucket(budget, max(1.0, budget))
+            return bucket
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def reserve(self, endpoint: str) -> float:
+        """
+        Reserva el turno de una petición y devuelve cuántos segundos hay que esperar.
+        Lo usan tanto los hilos (time.sleep) como las corrutinas (asyncio.sleep), así que
+        ambos caminos comparten el mismo presupuesto frente a Notion.
+        """
+        with self._lock:
+            wait = max(0.0, self._paused_until - time.monotonic())
+        bucket = self._bucket_for(endpoint)
+        if bucket:
+            wait = max(wait, bucket._reserve())
+        return max(wait, self._global._reserve())
+
+    def acquire(self, endpoint: str) -> float:
+        wait = self.reserve(endpoint)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class RetryPolicy:
+    """
+    Backoff exponencial con jitter completo; respeta Retry-After cuando Notion lo envía.
+    """
+
+    def __init__(self, max_retries: int = MAX_RETRIES, base_delay: float = 0.5, max_delay: float = 30.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay_for(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        if retry_after is not None:
+            return min(self.max_delay, retry_after) + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+shared_limiter = RateLimiter()
+default_retry_policy = RetryPolicy()
+
+
+def _parse_retry_after(headers: Any) -> Optional[float]:
+    if not headers:
+        return None
+    value = headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_transient_exception(error: Exception) -> bool:
+    return isinstance(error, (
+        requests.exceptions.ConnectionError,
+        requests.exceptions.Timeout,
+        httpx.TransportError,
+        RequestTimeoutError,
+    ))
+
+
+def _is_connect_exception(error: Exception) -> bool:
+    # Fallos en la fase de conexión: la petición no llegó a enviarse a Notion
+    if isinstance(error, (requests.exceptions.ConnectTimeout, httpx.ConnectError, httpx.ConnectTimeout)):
+        return True
+    if isinstance(error, RequestTimeoutError):
+        # notion_client convierte cualquier timeout de httpx en RequestTimeoutError
+        return isinstance(error.__context__, httpx.ConnectTimeout)
+    if isinstance(error, requests.exceptions.ConnectionError):
+        # requests también envuelve en ConnectionError las conexiones cortadas tras enviar
+        reason = getattr(error.args[0], "reason", None) if error.args else None
+        return isinstance(reason, (urllib3.exceptions.NewConnectionError, urllib3.exceptions.ConnectTimeoutError))
+    return False
+
+
+def _is_retryable_exception(error: Exception, idempotent: bool) -> bool:
+    # Un timeout de lectura puede llegar cuando Notion ya procesó la creación
+    return _is_transient_exception(error) if idempotent else _is_connect_exception(error)
+
+
+def _record_wait(endpoint: str, wait: float) -> None:
+    if wait > 0:
+        NOTION_RATE_LIMIT_WAIT.inc(wait, endpoint=endpoint)
+
+
+def _record_attempt(endpoint: str, started: float, status: Optional[int], error: Optional[Exception] = None) -> None:
+    # Un fallo de conexión no tiene código HTTP: se etiqueta con el tipo de excepción
+    NOTION_REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+    NOTION_REQUESTS.inc(endpoint=endpoint, status=status if status is not None else type(error).__name__)
+
+
+def call_with_retry(
+    send: Callable[[], Any],
+    endpoint: str,
+    limiter: RateLimiter = shared_limiter,
+    policy: RetryPolicy = default_retry_policy,
+    idempotent: bool = True
+) -> Any:
+    """
+    Ejecuta `send` respetando el limitador y reintentando errores transitorios.
+
+    `send` puede devolver un `requests.Response` (se reintenta según su status_code y se
+    devuelve la última respuesta) o lanzar errores de `notion_client` (se relanzan si se
+    agotan los reintentos). Con `idempotent=False` solo se reintentan los 429 y los fallos
+    de la fase de conexión (no los timeouts de lectura), para no duplicar creaciones que
+    Notion sí llegó a procesar.
+    """
+    attempt = 0
+    while True:
+        _record_wait(endpoint, limiter.acquire(endpoint))
+        started = time.perf_counter()
+        try:
+            result = send()
+        except HTTPResponseError as e:
+            _record_attempt(endpoint, started, e.status)
+            status, headers, error = e.status, e.headers, e
+        except Exception as e:
+            _record_attempt(endpoint, started, None, e)
+            if not _is_retryable_exception(e, idempotent) or attempt >= policy.max_retries:
+                raise
+            status, headers, error = None, None, e
+        else:
+            status = getattr(result, "status_code", None)
+            _record_attempt(endpoint, started, status)
+            if status not in RETRYABLE_STATUS_CODES or attempt >= policy.max_retries:
+                return result
+            headers, error = result.headers, None
+
+        retryable = status is None or status == 429 or (idempotent and status in RETRYABLE_STATUS_CODES)
+        if error is not None and (not retryable or attempt >= policy.max_retries):
+            raise error
+        if error is None and not retryable:
+            return result
+
+        retry_after = _parse_retry_after(headers)
+        delay = policy.delay_for(attempt, retry_after)
+        if status == 429:
+            # Todos los hilos esperan: seguir enviando solo alargaría la penalización
+            limiter.pause(delay)
+        NOTION_RETRIES.inc(endpoint=endpoint, reason=status if status is not None else type(error).__name__)
+        logger.warning(
+            f"Reintento {attempt + 1}/{policy.max_retries} de {endpoint} en {delay:.2f}s "
+            f"(estado: {status if status is not None else type(error).__name__})"
+        )
+        time.sleep(delay)
+        attempt += 1
+
+
+def _retry_decision(status: Optional[int], attempt: int, policy: RetryPolicy, idempotent: bool) -> bool:
+    # Un estado None es una excepción ya filtrada por _is_retryable_exception
+    if attempt >= policy.max_retries:
+        return False
+    return status is None or status == 429 or (idempotent and status in RETRYABLE_STATUS_CODES)
+
+
+async def async_call_with_retry(
+    send: Callable[[], Awaitable[Any]],
+    endpoint: str,
+    limiter: RateLimiter = shared_limiter,
+    policy: RetryPolicy = default_retry_policy,
+    idempotent: bool = True
+) -> Any:
+    """
+    Versión asyncio de `call_with_retry` para corrutinas que devuelven un `httpx.Response`:
+    mismas reglas de reintento, y las esperas ceden el bucle de eventos en lugar de bloquearlo.
+    """
+    attempt = 0
+    while True:
+        wait = limiter.reserve(endpoint)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        _record_wait(endpoint, wait)
+        started = time.perf_counter()
+        try:
+            result = await send()
+        except Exception as e:
+            _record_attempt(endpoint, started, None, e)
+            if not _is_retryable_exception(e, idempotent) or not _retry_decision(None, attempt, policy, idempotent):
+                raise
+            status, headers = None, None
+            error_name = type(e).__name__
+        else:
+            status = result.status_code
+            _record_attempt(endpoint, started, status)
+            if status not in RETRYABLE_STATUS_CODES or not _retry_decision(status, attempt, policy, idempotent):
+                return result
+            headers, error_name = result.headers, None
+
+        delay = policy.delay_for(attempt, _parse_retry_after(headers))
+        if status == 429:
+            limiter.pause(delay)
+        NOTION_RETRIES.inc(endpoint=endpoint, reason=status if status is not None else error_name)
+        logger.warning(
+            f"Reintento {attempt + 1}/{policy.max_retries} de {endpoint} en {delay:.2f}s "
+            f"(estado: {status if status is not None else error_name})"
+        )
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+class NotionHttpClient:
+    """
+    Cliente HTTP para la API de Notion con una sesión persistente (pool keep-alive),
+    cabeceras de autenticación predefinidas, limitador compartido y reintentos.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str,
+        notion_version: str,
+        pool_size: int = NOTION_POOL_SIZE,
+        timeout: float = 30,
+        limiter: RateLimiter = shared_limiter,
+        policy: RetryPolicy = default_retry_policy
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.limiter = limiter
+        self.policy = policy
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+            "Notion-Version": notion_version,
+        })
+
+    def request(self, method: str, path: str, endpoint: str, idempotent: bool = True, **kwargs) -> requests.Response:
+        url = f"{self.base_url}{path}"
+        kwargs.setdefault("timeout", self.timeout)
+        return call_with_retry(
+            lambda: self.session.request(method, url, **kwargs),
+            endpoint,
+            limiter=self.limiter,
+            policy=self.policy,
+            idempotent=idempotent
+        )
+
+    def get(self, path: str, endpoint: str, **kwargs) -> requests.Response:
+        return self.request("GET", path, endpoint, **kwargs)
+
+    def post(self, path: str, endpoint: str, **kwargs) -> requests.Response:
+        return self.request("POST", path, endpoint, **kwargs)
+
+    def patch(self, path: str, endpoint: str, **kwargs) -> requests.Response:
+        return self.request("PATCH", path, endpoint, **kwargs)
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class AsyncNotionHttpClient:
+    """
+    Cliente asyncio para la API de Notion sobre `httpx.AsyncClient`: un pool de conexiones
+    compartido y un semáforo que limita las peticiones en vuelo, de modo que un solo bucle
+    de eventos puede lanzar cientos de llamadas sin un hilo por petición. Comparte el
+    limitador con el cliente síncrono. Debe crearse y cerrarse dentro del bucle que lo usa
+    (`async with AsyncNotionHttpClient(...) as client:`).
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str,
+        notion_version: str,
+        pool_size: int = NOTION_POOL_SIZE,
+        max_in_flight: int = NOTION_ASYNC_MAX_IN_FLIGHT,
+        timeout: float = 30,
+        limiter: RateLimiter = shared_limiter,
+        policy: RetryPolicy = default_retry_policy
+    ):
+        self.limiter = limiter
+        self.policy = policy
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self.client = httpx.AsyncClient(
+            base_url=base_url.rstrip("/"),
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            headers={
+                "Authorization": f"Bearer {api_key}",
+                "Content-Type": "application/json",
+                "Notion-Version": notion_version,
+            },
+        )
+
+    async def request(self, method: str, path: str, endpoint: str, idempotent: bool = True, **kwargs) -> httpx.Response:
+        async with self._semaphore:
+            return await async_call_with_retry(
+                lambda: self.client.request(method, path, **kwargs),
+                endpoint,
+                limiter=self.limiter,
+                policy=self.policy,
+                idempotent=idempotent
+            )
+
+    async def get(self, path: str, endpoint: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", path, endpoint, **kwargs)
+
+    async def post(self, path: str, endpoint: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", path, endpoint, **kwargs)
+
+    async def patch(self, path: str, endpoint: str, **kwargs) -> httpx.Response:
+        return await self.request("PATCH", path, endpoint, **kwargs)
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+    async def __aenter__(self) -> "AsyncNotionHttpClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+
+class TTLCache:
+    """
+    Caché en memoria thread-safe con caducidad por entrada e invalidación explícita.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries: Dict[Any, Any] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return default
+            return value
+
+    def set(self, key: Any, value: Any, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+
+    def invalidate(self, key: Any = None) -> None:
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
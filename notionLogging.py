@@ -0,0 +1,190 @@
+import os
+import gzip
+import time
+import queue
+import atexit
+import shutil
+import logging
+import threading
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, Iterator, Optional, Tuple
+
+try:
+    import fcntl # Bloqueo entre procesos del archivo de log (solo POSIX)
+except ImportError:
+    fcntl = None
+
+from metrics import counter
+
+LOG_FILE = os.getenv("NOTION_LOG_FILE", "notion_integration.log")
+LOG_LEVEL = os.getenv("NOTION_LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+# El archivo rota al superar este tamaño o al cumplir su antigüedad, lo que ocurra antes
+LOG_MAX_BYTES = int(os.getenv("NOTION_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_ROTATE_SECONDS = int(os.getenv("NOTION_LOG_ROTATE_SECONDS", str(24 * 3600)))
+LOG_BACKUP_COUNT = int(os.getenv("NOTION_LOG_BACKUPS", "7"))
+# Mensajes muestreados (errores por página): como mucho LOG_SAMPLE_BURST por clave y ventana
+LOG_SAMPLE_BURST = int(os.getenv("NOTION_LOG_SAMPLE_BURST", "20"))
+LOG_SAMPLE_WINDOW = float(os.getenv("NOTION_LOG_SAMPLE_WINDOW", "60"))
+# Registros que admite la cola antes de descartar (el hilo que registra nunca espera al disco)
+LOG_QUEUE_SIZE = int(os.getenv("NOTION_LOG_QUEUE_SIZE", "10000"))
+
+LOG_RECORDS_DROPPED = counter("log_records_dropped_total", "Registros de log descartados por tener la cola llena")
+
+
+class SizeTimeRotatingFileHandler(RotatingFileHandler):
+    """
+    RotatingFileHandler que además rota cada `interval` segundos y comprime con gzip
+    las copias rotadas (`notion_integration.log.1.gz`, `.2.gz`, ...).
+
+    Varios procesos (workers de gunicorn) pueden compartir el archivo: cada escritura y
+    cada rotación se hacen con un bloqueo exclusivo sobre `<archivo>.lock`, y antes de
+    escribir se reabre el archivo si otro proceso ya lo rotó. La antigüedad se mide con la
+    fecha de modificación del archivo de bloqueo, que se actualiza al rotar, así que todos
+    los procesos comparten el mismo reloj y solo uno rota cada vez.
+    """
+
+    def __init__(self, filename: str, max_bytes: int, interval: float, backup_count: int, encoding: str = "utf-8"):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding=encoding, delay=True)
+        self.interval = interval
+        self.namer = lambda name: name + ".gz"
+        self.rotator = self._compress
+        self.lock_path = self.baseFilename + ".lock"
+        created = not os.path.exists(self.lock_path)
+        self._lock_file = open(self.lock_path, "a")
+        if created and os.path.exists(self.baseFilename):
+            # La antigüedad cuenta desde la última modificación del archivo existente, no desde el arranque
+            mtime = os.path.getmtime(self.baseFilename)
+            os.utime(self.lock_path, (mtime, mtime))
+
+    @staticmethod
+    def _compress(source: str, dest: str) -> None:
+        with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+            shutil.copyfileobj(f_in, f_out)
+        os.remove(source)
+
+    @contextmanager
+    def _interprocess_lock(self) -> Iterator[None]:
+        # Sin fcntl (Windows) solo se usa en desarrollo con un único proceso
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _reopen_if_rotated(self) -> None:
+        if self.stream is None:
+            return
+        try:
+            current = os.stat(self.baseFilename)
+        except FileNotFoundError:
+            current = None
+        opened = os.fstat(self.stream.fileno())
+        if current is None or (current.st_dev, current.st_ino) != (opened.st_dev, opened.st_ino):
+            self.stream.close()
+            self.stream = None
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if self.interval > 0 and os.path.exists(self.baseFilename):
+            if time.time() - os.path.getmtime(self.lock_path) >= self.interval:
+                return True
+        return bool(super().shouldRollover(record))
+
+    def doRollover(self) -> None:
+        super().doRollover()
+        os.utime(self.lock_path)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            with self._interprocess_lock():
+                self._reopen_if_rotated()
+                if self.shouldRollover(record):
+                    self.doRollover()
+                logging.FileHandler.emit(self, record)
+                # Vaciar antes de soltar el bloqueo: otro proceso puede rotar justo después
+                self.flush()
+        except Exception:
+            self.handleError(record)
+
+    def close(self) -> None:
+        super().close()
+        self._lock_file.close()
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Deja pasar como mucho `burst` registros por ventana de `window` segundos para cada
+    `sample_key` (se indica con `extra={"sample_key": ...}`); los registros sin clave
+    pasan siempre. El primer registro de la ventana siguiente indica cuántos se omitieron.
+    """
+
+    def __init__(self, burst: int = LOG_SAMPLE_BURST, window: float = LOG_SAMPLE_WINDOW):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self._windows: Dict[str, Tuple[float, int, int]] = {} # clave -> (inicio, emitidos, omitidos)
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = getattr(record, "sample_key", None)
+        if key is None:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            started, emitted, suppressed = self._windows.get(key, (now, 0, 0))
+            if now - started >= self.window:
+                if suppressed:
+                    record.msg = f"{record.getMessage()} ({suppressed} mensajes similares omitidos en los últimos {self.window:.0f}s)"
+                    record.args = None
+                started, emitted, suppressed = now, 0, 0
+            if emitted >= self.burst:
+                self._windows[key] = (started, emitted, suppressed + 1)
+                return False
+            self._windows[key] = (started, emitted + 1, suppressed)
+            return True
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    # Con la cola llena (disco lento) se descarta el registro en lugar de bloquear el ajuste
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+
+_listener: Optional[QueueListener] = None
+_lock = threading.Lock()
+
+
+def configure_logging(filename: str = LOG_FILE, level: str = LOG_LEVEL) -> None:
+    """
+    Configura el logger raíz una sola vez por proceso: los hilos solo encolan el registro
+    y un QueueListener en segundo plano lo escribe en consola y en el archivo rotado.
+    """
+    global _listener
+    with _lock:
+        if _listener is not None:
+            return
+        formatter = logging.Formatter(LOG_FORMAT)
+        file_handler = SizeTimeRotatingFileHandler(filename, LOG_MAX_BYTES, LOG_ROTATE_SECONDS, LOG_BACKUP_COUNT)
+        stream_handler = logging.StreamHandler()
+        for handler in (file_handler, stream_handler):
+            handler.setFormatter(formatter)
+
+        log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(LOG_QUEUE_SIZE)
+        queue_handler = _NonBlockingQueueHandler(log_queue)
+        # El muestreo se aplica antes de encolar: lo omitido no llega a formatearse
+        queue_handler.addFilter(SamplingFilter())
+
+        root = logging.getLogger()
+        root.setLevel(level)
+        root.addHandler(queue_handler)
+        _listener = QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+        _listener.start()
+        # Vacía la cola al salir para no perder las últimas líneas
+        atexit.register(_listener.stop)
@@ -1,6 +1,10 @@
 import os
+import asyncio
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from notion_client import Client
 from dotenv import load_dotenv
+from notionApi import call_with_retry, AsyncNotionHttpClient, NOTION_POOL_SIZE
 
 # Carga las variables de entorno desde el archivo .env
 load_dotenv()
@@ -17,62 +21,226 @@ notion = Client(auth=notion_api)
 DATABASE_ID_PROYECTOS = os.environ.get("DATABASE_ID_PROYECTOS")
 DATABASE_ID_PARTIDAS = os.environ.get("DATABASE_ID_PARTIDAS")
 
+API_BASE_URL = "https://api.notion.com/v1"
+NOTION_VERSION = "2022-06-28"
+
+# Partidas que se crean a la vez; el limitador compartido fija el ritmo real de peticiones
+MAX_CONCURRENT_CREATES = int(os.environ.get("NOTION_MAX_CONCURRENT_CREATES", "4"))
+
 # --- (El resto del código de la función crear_proyecto queda igual) ---
 def crear_proyecto(nombre_proyecto):
     """
     Crea una nueva página de proyecto en la base de datos de Proyectos.
     """
     try:
-        response = notion.pages.create(
-            parent={"database_id": DATABASE_ID_PROYECTOS},
-            properties={
-                "ID del proyecto": {"title": [{"text": {"content": nombre_proyecto}}]},
-                # ... (puedes añadir más propiedades aquí si tu base de datos de Proyectos tiene más campos)
-            }
+        # Creación no idempotente: solo se reintentan 429 y fallos de conexión
+        response = call_with_retry(
+            lambda: notion.pages.create(
+                parent={"database_id": DATABASE_ID_PROYECTOS},
+                properties={
+                    "ID del proyecto": {"title": [{"text": {"content": nombre_proyecto}}]},
+                    # ... (puedes añadir más propiedades aquí si tu base de datos de Proyectos tiene más campos)
+                }
+            ),
+            "pages.create",
+            idempotent=False
         )
         return response['id']
     except Exception as e:
         print(f"Error al crear el proyecto '{nombre_proyecto}': {e}")
         return None
 
-def crear_partidas(num_partidas, proyecto_id):
+def _propiedades_partida(nombre_partida, proyecto_id):
+    # ... (puedes añadir más propiedades aquí si tu base de datos de Partidas tiene más campos)
+    return {
+        "ID de partida": {"title": [{"text": {"content": nombre_partida}}]},
+        "Proyectos": {"relation": [{"id": proyecto_id}]},
+    }
+
+def _crear_partida(nombre_partida, proyecto_id):
+    # Creación no idempotente: solo se reintentan 429 y fallos de conexión
+    response = call_with_retry(
+        lambda: notion.pages.create(
+            parent={"database_id": DATABASE_ID_PARTIDAS},
+            properties=_propiedades_partida(nombre_partida, proyecto_id)
+        ),
+        "pages.create",
+        idempotent=False
+    )
+    return response['id']
+
+def buscar_proyecto(nombre_proyecto, creado_desde):
     """
-    Crea múltiples páginas de partida en la base de datos de Partidas y las relaciona con el proyecto.
-    El nombre de cada partida ahora incluye el nombre del proyecto y un contador.
+    Busca un proyecto con ese nombre creado desde `creado_desde` (datetime UTC). Sirve para
+    recuperar el ID de un proyecto que Notion sí creó aunque la respuesta no llegó.
     """
-    partidas_ids = []
+    # Notion redondea created_time al minuto: se amplía un minuto el margen
+    desde = (creado_desde - timedelta(minutes=1)).replace(microsecond=0).isoformat() + "Z"
+    response = call_with_retry(
+        lambda: notion.databases.query(
+            database_id=DATABASE_ID_PROYECTOS,
+            filter={"and": [
+                {"property": "ID del proyecto", "title": {"equals": nombre_proyecto}},
+                {"timestamp": "created_time", "created_time": {"on_or_after": desde}},
+            ]},
+            sorts=[{"timestamp": "created_time", "direction": "ascending"}],
+            page_size=1
+        ),
+        "databases.query"
+    )
+    resultados = response.get("results", [])
+    return resultados[0]["id"] if resultados else None
 
-    # 1. Obtener el nombre del proyecto a partir del proyecto_id
-    try:
-        proyecto_page = notion.pages.retrieve(proyecto_id) # Recupera la página del proyecto usando su ID
-        proyecto_nombre = proyecto_page['properties']['ID del proyecto']['title'][0]['plain_text'] # Asume que "ID del proyecto" es la propiedad 'Title'
-    except Exception as e:
-        print(f"Error al obtener el nombre del proyecto con ID '{proyecto_id}': {e}")
-        return partidas_ids # Devuelve una lista vacía de partidas_ids si no se puede obtener el nombre del proyecto
+def buscar_partidas(proyecto_id):
+    """
+    Devuelve {nombre de partida: ID} de las partidas ya relacionadas con el proyecto.
+    """
+    partidas = {}
+    cursor = None
+    while True:
+        kwargs = {"start_cursor": cursor} if cursor else {}
+        response = call_with_retry(
+            lambda: notion.databases.query(
+                database_id=DATABASE_ID_PARTIDAS,
+                filter={"property": "Proyectos", "relation": {"contains": proyecto_id}},
+                page_size=100,
+                **kwargs
+            ),
+            "databases.query"
+        )
+        for pagina in response.get("results", []):
+            titulo = pagina["properties"].get("ID de partida", {}).get("title") or []
+            nombre = "".join(parte.get("plain_text", "") for parte in titulo)
+            if nombre:
+                partidas.setdefault(nombre, pagina["id"])
+        if not response.get("has_more"):
+            return partidas
+        cursor = response.get("next_cursor")
 
+def _resultados_partidas(num_partidas, proyecto_nombre, existentes=None):
+    # Un resultado por partida, en orden; las de `existentes` ya traen su ID y no se crean
+    existentes = existentes or {}
+    resultados = []
     for i in range(num_partidas):
-        # 2. Construir el nombre de la partida con el formato deseado
-        partida_conteo = f"{i:02d}.00" # Formatea el contador a "00.00", "01.00", "02.00", etc.
-        nombre_partida = f"{proyecto_nombre}-{partida_conteo}" # Combina nombre del proyecto y contador
+        nombre_partida = f"{proyecto_nombre}-{i:02d}.00" # Combina nombre del proyecto y contador "00.00", "01.00", ...
+        resultados.append({
+            "indice": i,
+            "nombre": nombre_partida,
+            "id": existentes.get(nombre_partida),
+            "error": None,
+        })
+    return resultados
 
+def crear_partidas(num_partidas, proyecto_id, proyecto_nombre=None, max_workers=MAX_CONCURRENT_CREATES, existentes=None):
+    """
+    Crea múltiples páginas de partida en la base de datos de Partidas y las relaciona con el proyecto.
+    El nombre de cada partida incluye el nombre del proyecto y un contador.
+    Las partidas se crean en paralelo (como mucho `max_workers` a la vez, con el limitador
+    compartido de Notion). Devuelve una lista en orden de partida con un dict por partida:
+    {"indice", "nombre", "id", "error"}; `id` es None y `error` describe el fallo si no se creó.
+    Las partidas de `existentes` ({nombre: ID}, p. ej. de un intento anterior) no se vuelven
+    a crear: se devuelven con su ID para completar el conjunto sin duplicados.
+    """
+    # 1. El nombre del proyecto lo pasa quien lo acaba de crear; solo se consulta si no se conoce
+    if proyecto_nombre is None:
         try:
-            response = notion.pages.create(
-                parent={"database_id": DATABASE_ID_PARTIDAS},
-                properties={
-                    "ID de partida": {"title": [{"text": {"content": nombre_partida}}]}, # Usa el nuevo nombre de partida
-                    "Proyectos": {
-                        "relation": [
-                            {"id": proyecto_id}
-                        ]
-                    },
-                    # ... (puedes añadir más propiedades aquí si tu base de datos de Partidas tiene más campos)
-                }
-            )
-            partidas_ids.append(response['id'])
-            print(f"Partida '{nombre_partida}' creada con ID: {response['id']}")
+            proyecto_page = call_with_retry(lambda: notion.pages.retrieve(proyecto_id), "pages.retrieve") # Recupera la página del proyecto usando su ID
+            proyecto_nombre = proyecto_page['properties']['ID del proyecto']['title'][0]['plain_text'] # Asume que "ID del proyecto" es la propiedad 'Title'
         except Exception as e:
-            print(f"Error al crear la partida '{nombre_partida}': {e}")
-    return partidas_ids
+            print(f"Error al obtener el nombre del proyecto con ID '{proyecto_id}': {e}")
+            return [] # Devuelve una lista vacía si no se puede obtener el nombre del proyecto
+
+    # 2. Construir el nombre de cada partida con el formato deseado
+    resultados = _resultados_partidas(num_partidas, proyecto_nombre, existentes)
+    pendientes = [resultado for resultado in resultados if not resultado["id"]]
+    if not pendientes:
+        return resultados
+
+    # 3. Crear en paralelo; cada resultado vuelve a su posición, así que el orden no depende de cuál termine antes
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(pendientes))), thread_name_prefix="notion-create") as executor:
+        futures = {
+            executor.submit(_crear_partida, resultado["nombre"], proyecto_id): resultado
+            for resultado in pendientes
+        }
+        for future in as_completed(futures):
+            resultado = futures[future]
+            try:
+                resultado["id"] = future.result()
+                print(f"Partida '{resultado['nombre']}' creada con ID: {resultado['id']}")
+            except Exception as e:
+                resultado["error"] = str(e)
+                print(f"Error al crear la partida '{resultado['nombre']}': {e}")
+    return resultados
+
+# --- Variantes asyncio: un solo bucle de eventos con pool de conexiones y semáforo compartidos ---
+def nuevo_cliente_async(**kwargs):
+    # Crear dentro del bucle que lo va a usar y cerrar con `async with` o `aclose()`
+    return AsyncNotionHttpClient(notion_api, API_BASE_URL, NOTION_VERSION, **kwargs)
+
+async def crear_proyecto_async(client, nombre_proyecto):
+    """
+    Igual que `crear_proyecto`, sobre el cliente asyncio compartido.
+    """
+    try:
+        response = await client.post(
+            "/pages", "pages.create", idempotent=False,
+            json={
+                "parent": {"database_id": DATABASE_ID_PROYECTOS},
+                "properties": {"ID del proyecto": {"title": [{"text": {"content": nombre_proyecto}}]}},
+            }
+        )
+        response.raise_for_status()
+        return response.json()['id']
+    except Exception as e:
+        print(f"Error al crear el proyecto '{nombre_proyecto}': {e}")
+        return None
+
+async def _crear_partida_async(client, resultado, proyecto_id):
+    try:
+        response = await client.post(
+            "/pages", "pages.create", idempotent=False,
+            json={
+                "parent": {"database_id": DATABASE_ID_PARTIDAS},
+                "properties": _propiedades_partida(resultado["nombre"], proyecto_id),
+            }
+        )
+        response.raise_for_status()
+        resultado["id"] = response.json()['id']
+        print(f"Partida '{resultado['nombre']}' creada con ID: {resultado['id']}")
+    except Exception as e:
+        resultado["error"] = str(e)
+        print(f"Error al crear la partida '{resultado['nombre']}': {e}")
+
+async def crear_partidas_async(client, num_partidas, proyecto_id, proyecto_nombre, existentes=None):
+    """
+    Igual que `crear_partidas` (mismo formato de resultados, en orden de partida, y las de
+    `existentes` no se vuelven a crear), pero todas las creaciones se lanzan a la vez en el
+    bucle de eventos; el semáforo del cliente y el limitador compartido controlan cuántas
+    salen y a qué ritmo.
+    """
+    resultados = _resultados_partidas(num_partidas, proyecto_nombre, existentes)
+    pendientes = [resultado for resultado in resultados if not resultado["id"]]
+    await asyncio.gather(*(_crear_partida_async(client, resultado, proyecto_id) for resultado in pendientes))
+    return resultados
+
+def crear_partidas_en_bucle(num_partidas, proyecto_id, proyecto_nombre, existentes=None):
+    """
+    Punto de entrada síncrono (rutas de Flask): crea las partidas con `crear_partidas_async`
+    en un bucle de eventos propio, con un solo pool de conexiones para todas.
+    """
+    async def crear():
+        # Más peticiones en vuelo que conexiones del pool solo harían cola dentro de httpx
+        async with nuevo_cliente_async(max_in_flight=NOTION_POOL_SIZE) as client:
+            return await crear_partidas_async(client, num_partidas, proyecto_id, proyecto_nombre, existentes)
+    return asyncio.run(crear())
+
+async def crear_proyecto_con_partidas_async(nombre_proyecto, num_partidas):
+    # Devuelve (proyecto_id, resultados de partidas); proyecto_id es None si falló el proyecto
+    async with nuevo_cliente_async() as client:
+        proyecto_id = await crear_proyecto_async(client, nombre_proyecto)
+        if not proyecto_id:
+            return None, []
+        return proyecto_id, await crear_partidas_async(client, num_partidas, proyecto_id, nombre_proyecto)
 
 if __name__ == "__main__":
     nombre_proyecto_usuario = input("Introduce el nombre del proyecto: ")
@@ -81,11 +249,12 @@ if __name__ == "__main__":
     proyecto_page_id = crear_proyecto(nombre_proyecto_usuario)
     if proyecto_page_id:
         print(f"Proyecto '{nombre_proyecto_usuario}' creado con ID: {proyecto_page_id}")
-        partidas_ids = crear_partidas(num_partidas_usuario, proyecto_page_id)
-        if partidas_ids:
-            print(f"Se crearon {len(partidas_ids)} partidas para el proyecto '{nombre_proyecto_usuario}'.")
+        partidas = crear_partidas(num_partidas_usuario, proyecto_page_id, nombre_proyecto_usuario)
+        creadas = [partida for partida in partidas if partida["id"]]
+        if creadas and len(creadas) == len(partidas):
+            print(f"Se crearon {len(creadas)} partidas para el proyecto '{nombre_proyecto_usuario}'.")
             print("¡Proceso completado con éxito!")
         else:
-            print("Hubo errores al crear las partidas.")
+            print(f"Hubo errores al crear las partidas ({len(creadas)} de {num_partidas_usuario} creadas).")
     else:
         print("Hubo errores al crear el proyecto.")
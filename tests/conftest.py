@@ -0,0 +1,51 @@
+"""
+Configuración común de las pruebas: mH2 exige las credenciales de Notion al importarse,
+así que se fijan valores falsos antes de importarlo. Ninguna prueba llega a la API real.
+"""
+import contextlib
+import os
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, "bench"))
+
+os.environ.setdefault("NOTION_API_KEY", "test")
+os.environ.setdefault("DATABASE_ID_PLANES", "fake-planes")
+
+import notionLogging # noqa: E402
+
+# El hilo del log escribe en consola hasta el atexit, cuando la captura de pytest ya está
+# cerrada: la consola se descarta y las líneas quedan en el archivo de log
+_console = open(os.devnull, "w")
+with contextlib.redirect_stderr(_console):
+    notionLogging.configure_logging()
+
+
+@pytest.fixture
+def notion_server(monkeypatch):
+    """
+    Notion falso de bench/fake_notion.py en un hilo, con mH2 apuntando a él.
+    Devuelve el FakeNotionState para inspeccionar y modificar las páginas.
+    """
+    import fake_notion
+    import mH2
+    from notionApi import NotionHttpClient, RateLimiter, RetryPolicy
+
+    state = fake_notion.FakeNotionState(pages=30)
+    server, url = fake_notion.serve(state)
+    client = NotionHttpClient(
+        "test", f"{url}/v1", mH2.NOTION_VERSION,
+        limiter=RateLimiter(1000, 1000, endpoint_budgets={}),
+        policy=RetryPolicy(base_delay=0.01)
+    )
+    monkeypatch.setattr(mH2, "DATABASE_ID", fake_notion.DATABASE_ID)
+    monkeypatch.setattr(mH2, "notion_http", client)
+    mH2.invalidate_schema_cache()
+    yield state
+    mH2.invalidate_schema_cache()
+    client.close()
+    server.shutdown()
+    server.server_close()
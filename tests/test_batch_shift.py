@@ -0,0 +1,56 @@
+from datetime import datetime
+
+import mH2
+
+
+def page(page_id, start, end=None):
+    return mH2.ScheduledPage(page_id, start, end, None)
+
+
+def operation(hours, start_date, pages):
+    return {"hours": hours, "start_date": start_date, "filters": None, "pages": pages}
+
+
+def plans_by_page(plans):
+    return {plan.page_id: plan for plan in plans if isinstance(plan, mH2.PlannedUpdate)}
+
+
+def test_pages_selected_by_several_operations_get_one_net_shift():
+    a = page("a", "2025-01-10T08:00:00.000-06:00", "2025-01-10T10:00:00.000-06:00")
+    b = page("b", "2025-01-20T08:00:00.000-06:00")
+    plans = list(mH2.plan_batch_shift([
+        operation(3, datetime(2025, 1, 1), [a, b]),
+        operation(-1, datetime(2025, 1, 15), [b]),
+    ]))
+
+    assert len(plans) == 2
+    moved = plans_by_page(plans)
+    assert moved["a"].new_start == datetime(2025, 1, 10, 11, 0)
+    assert moved["a"].new_end == datetime(2025, 1, 10, 13, 0)
+    assert moved["b"].new_start == datetime(2025, 1, 20, 10, 0)
+    # Las fechas originales se conservan para el diario y la reversión
+    assert moved["b"].original_start == "2025-01-20T08:00:00.000-06:00"
+
+
+def test_operations_that_cancel_out_send_no_patch():
+    a = page("a", "2025-01-10T08:00:00.000-06:00")
+    plans = list(mH2.plan_batch_shift([
+        operation(4, datetime(2025, 1, 1), [a]),
+        operation(-4, datetime(2025, 1, 1), [a]),
+    ]))
+    assert plans == ["skip"]
+
+
+def test_cutoff_is_evaluated_per_operation_against_original_dates():
+    # La segunda operación no ve la página desplazada por la primera: su fecha original es anterior al corte
+    a = page("a", "2025-01-10T20:00:00.000-06:00")
+    plans = list(mH2.plan_batch_shift([
+        operation(8, datetime(2025, 1, 10), [a]),
+        operation(2, datetime(2025, 1, 11), [a]),
+    ]))
+    assert plans_by_page(plans)["a"].new_start == datetime(2025, 1, 11, 4, 0)
+
+
+def test_unparseable_dates_count_as_errors():
+    plans = list(mH2.plan_batch_shift([operation(1, datetime(2025, 1, 1), [page("x", "mañana"), page("y", None)])]))
+    assert sorted(plans) == ["error", "skip"]
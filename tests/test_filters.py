@@ -0,0 +1,105 @@
+import pytest
+
+import mH2
+
+DB_PROPERTIES = {
+    "Cliente": {"type": "select"},
+    "Horas": {"type": "number"},
+    "Date": {"type": "date"},
+    "Activo": {"type": "checkbox"},
+    "ID del proyecto": {"type": "title"},
+}
+
+
+def leaf(name, op, value=None):
+    return {"property": name, "op": op, "value": value}
+
+
+def test_in_becomes_or_of_equalities():
+    filters = mH2.compile_filter_expression(leaf("Cliente", "in", ["ACME", "Globex"]), DB_PROPERTIES)
+    assert filters == [{"or": [
+        {"property": "Cliente", "select": {"equals": "ACME"}},
+        {"property": "Cliente", "select": {"equals": "Globex"}},
+    ]}]
+
+
+def test_not_in_is_flattened_into_the_top_level_and():
+    filters = mH2.compile_filter_expression(leaf("Cliente", "not_in", ["ACME", "Globex"]), DB_PROPERTIES)
+    assert filters == [
+        {"property": "Cliente", "select": {"does_not_equal": "ACME"}},
+        {"property": "Cliente", "select": {"does_not_equal": "Globex"}},
+    ]
+
+
+def test_between_becomes_inclusive_range_with_coerced_values():
+    filters = mH2.compile_filter_expression(leaf("Horas", "between", ["2", "4.5"]), DB_PROPERTIES)
+    assert filters == [
+        {"property": "Horas", "number": {"greater_than_or_equal_to": 2}},
+        {"property": "Horas", "number": {"less_than_or_equal_to": 4.5}},
+    ]
+
+
+def test_nested_groups_of_the_same_kind_are_flattened():
+    expression = {"and": [
+        {"and": [leaf("Cliente", "eq", "ACME"), leaf("Activo", "eq", "on")]},
+        {"or": [{"or": [leaf("Horas", "gt", "1")]}, leaf("Horas", "empty")]},
+    ]}
+    assert mH2.compile_filter_expression(expression, DB_PROPERTIES) == [
+        {"property": "Cliente", "select": {"equals": "ACME"}},
+        {"property": "Activo", "checkbox": {"equals": True}},
+        {"or": [
+            {"property": "Horas", "number": {"greater_than": 1}},
+            {"property": "Horas", "number": {"is_empty": True}},
+        ]},
+    ]
+
+
+def test_depth_limit():
+    allowed = {"or": [{"and": [leaf("Cliente", "eq", "ACME"), leaf("Horas", "gt", "1")]}, leaf("Activo", "eq", True)]}
+    assert len(mH2.compile_filter_expression(allowed, DB_PROPERTIES)) == 1
+
+    too_deep = {"or": [
+        {"and": [{"or": [leaf("Cliente", "eq", "ACME"), leaf("Cliente", "eq", "Globex")]}, leaf("Horas", "gt", "1")]},
+        leaf("Activo", "eq", True),
+    ]}
+    with pytest.raises(ValueError, match="anida demasiados grupos"):
+        mH2.compile_filter_expression(too_deep, DB_PROPERTIES)
+
+
+@pytest.mark.parametrize("node", [
+    leaf("Cliente", "gt", "ACME"), # Rangos solo en números y fechas
+    leaf("Date", "neq", "2025-01-01"), # Notion no tiene 'distinto' para fechas
+    leaf("Activo", "empty"), # Una casilla nunca está vacía
+])
+def test_operator_rejected_for_property_type(node):
+    with pytest.raises(ValueError, match="no se admite"):
+        mH2.compile_filter_expression(node, DB_PROPERTIES)
+
+
+def test_unknown_property_and_invalid_value_are_rejected():
+    with pytest.raises(ValueError, match="no encontrada"):
+        mH2.compile_filter_expression(leaf("Nada", "eq", "x"), DB_PROPERTIES)
+    with pytest.raises(ValueError, match="no válido"):
+        mH2.compile_filter_expression(leaf("Horas", "eq", "muchas"), DB_PROPERTIES)
+
+
+def test_normalize_converts_flat_filters_and_validates_expressions():
+    assert mH2.normalize_filter_expression({"Cliente": "ACME"}) == {"and": [leaf("Cliente", "eq", "ACME")]}
+    with pytest.raises(ValueError, match="lista de valores"):
+        mH2.normalize_filter_expression(leaf("Cliente", "in", "ACME"))
+    with pytest.raises(ValueError, match="lista no vacía"):
+        mH2.normalize_filter_expression({"and": []})
+
+
+def test_flat_filters_reject_unknown_properties_with_cached_schema(monkeypatch):
+    calls = []
+
+    def get_database_properties(force_refresh=False):
+        calls.append(force_refresh)
+        # El refresco falla: se conserva el esquema en caché
+        return {} if force_refresh else DB_PROPERTIES
+
+    monkeypatch.setattr(mH2, "get_database_properties", get_database_properties)
+    with pytest.raises(ValueError, match="'Nada' no encontrada"):
+        mH2.build_filter_from_properties({"Cliente": "ACME", "Nada": "x"})
+    assert calls == [False, True]
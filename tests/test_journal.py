@@ -0,0 +1,87 @@
+"""
+Ajuste con diario, reanudación tras una caída y reversión contra el Notion falso de bench/.
+"""
+from datetime import datetime, timedelta
+
+import mH2
+
+START_DATE = datetime(2025, 1, 1)
+
+
+class MemoryJournal:
+    """
+    Diario en memoria con la interfaz de app.DbJournal (ver mH2.apply_planned_updates).
+    """
+
+    def __init__(self, verify=False):
+        self.verify = verify
+        self.entries = {} # page_id -> [PlannedUpdate, estado]
+
+    def contains(self, page_id):
+        return page_id in self.entries
+
+    def unfinished(self):
+        for plan, status in list(self.entries.values()):
+            if status != "updated":
+                yield mH2.PlannedUpdate(plan.page_id, plan.original_start, plan.original_end,
+                                        plan.new_start, plan.new_end, verify=self.verify)
+
+    def begin(self, plans):
+        for plan in plans:
+            self.entries.setdefault(plan.page_id, [plan, "pending"])
+
+    def finish(self, plan, ok):
+        self.entries[plan.page_id][1] = "updated" if ok else "failed"
+
+    def flush(self):
+        pass
+
+    def rollback_entries(self):
+        return [
+            (plan.page_id, plan.original_start, plan.original_end, plan.new_start.isoformat(),
+             plan.new_end.isoformat() if plan.new_end else None)
+            for plan, status in self.entries.values() if status == "updated"
+        ]
+
+
+def start_dates(state):
+    return {page_id: mH2.parse_notion_datetime(page["properties"]["Date"]["date"]["start"])
+            for page_id, page in state.pages.items()}
+
+
+def test_resume_after_crash_shifts_every_page_exactly_once(notion_server):
+    original = start_dates(notion_server)
+    journal = MemoryJournal()
+
+    # Caída simulada: se anotó un lote de 10, salieron 5 PATCH y solo 3 llegaron al diario
+    plans = list(mH2.plan_date_shift(mH2.iter_target_pages(START_DATE), 2, START_DATE))
+    journal.begin(plans[:10])
+    for plan in plans[:5]:
+        assert mH2.update_page(plan.page_id, plan.new_start, plan.new_end)[0] == 200
+    for plan in plans[:3]:
+        journal.finish(plan, True)
+
+    counters = {}
+    mH2.adjust_dates_with_filters(2, START_DATE, journal=journal, resume=True, on_progress=counters.update)
+
+    assert start_dates(notion_server) == {page_id: start + timedelta(hours=2) for page_id, start in original.items()}
+    # 7 entradas pendientes del diario más las 20 páginas que no llegó a anotar
+    assert (counters["updated"], counters["failed"]) == (27, 0)
+    assert all(status == "updated" for _, status in journal.entries.values())
+
+
+def test_rollback_restores_original_dates_and_skips_pages_edited_since(notion_server):
+    original = start_dates(notion_server)
+    journal = MemoryJournal()
+    mH2.adjust_dates_with_filters(3, START_DATE, journal=journal)
+
+    edited_id = next(iter(notion_server.pages))
+    notion_server.pages[edited_id]["properties"]["Date"]["date"]["start"] = "2031-01-01T08:00:00.000-06:00"
+
+    result = mH2.rollback_date_adjustment(journal.rollback_entries())
+
+    assert result["success"]
+    assert result["changed_pages"] == [edited_id]
+    restored = start_dates(notion_server)
+    assert restored.pop(edited_id) == datetime(2031, 1, 1, 8, 0)
+    assert restored == {page_id: start for page_id, start in original.items() if page_id != edited_id}
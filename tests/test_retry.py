@@ -0,0 +1,87 @@
+import httpx
+import pytest
+import requests
+import urllib3
+from notion_client.errors import RequestTimeoutError
+
+from notionApi import RateLimiter, RetryPolicy, _is_retryable_exception, call_with_retry
+
+
+def connection_error(reason):
+    # requests envuelve en ConnectionError tanto los fallos de conexión como los cortes tras enviar
+    return requests.exceptions.ConnectionError(urllib3.exceptions.MaxRetryError(None, "/v1/pages", reason=reason))
+
+
+def notion_timeout(cause):
+    # notion_client relanza cualquier timeout de httpx como RequestTimeoutError
+    try:
+        raise cause
+    except httpx.TimeoutException:
+        try:
+            raise RequestTimeoutError()
+        except RequestTimeoutError as error:
+            return error
+
+
+@pytest.mark.parametrize("error, idempotent_retry, create_retry", [
+    (requests.exceptions.ConnectTimeout(), True, True),
+    (requests.exceptions.ReadTimeout(), True, False),
+    (connection_error(urllib3.exceptions.NewConnectionError(None, "rechazada")), True, True),
+    (connection_error(urllib3.exceptions.ProtocolError("Connection aborted")), True, False),
+    (httpx.ConnectError("rechazada"), True, True),
+    (httpx.ReadTimeout("lenta"), True, False),
+    (notion_timeout(httpx.ConnectTimeout("sin conexión")), True, True),
+    (notion_timeout(httpx.ReadTimeout("lenta")), True, False),
+    (ValueError("no es de red"), False, False),
+])
+def test_is_retryable_exception(error, idempotent_retry, create_retry):
+    assert _is_retryable_exception(error, idempotent=True) is idempotent_retry
+    assert _is_retryable_exception(error, idempotent=False) is create_retry
+
+
+def response(status):
+    result = requests.Response()
+    result.status_code = status
+    return result
+
+
+def run(outcomes, idempotent):
+    # Cada llamada a send consume un resultado: una excepción se lanza, un código se devuelve
+    calls = []
+
+    def send():
+        outcome = outcomes[len(calls)]
+        calls.append(outcome)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return response(outcome)
+
+    result = call_with_retry(
+        send, "pages.create",
+        limiter=RateLimiter(1000, 1000, endpoint_budgets={}),
+        policy=RetryPolicy(max_retries=3, base_delay=0),
+        idempotent=idempotent
+    )
+    return result, len(calls)
+
+
+def test_non_idempotent_call_does_not_retry_a_read_timeout():
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        run([requests.exceptions.ReadTimeout(), 200], idempotent=False)
+
+
+def test_non_idempotent_call_retries_connect_failures_and_rate_limits():
+    result, calls = run([requests.exceptions.ConnectTimeout(), 429, 200], idempotent=False)
+    assert (result.status_code, calls) == (200, 3)
+
+
+def test_non_idempotent_call_returns_server_errors_without_retrying():
+    result, calls = run([502, 200], idempotent=False)
+    assert (result.status_code, calls) == (502, 1)
+
+
+def test_idempotent_call_retries_transient_failures_until_the_limit():
+    result, calls = run([requests.exceptions.ReadTimeout(), 502, 200], idempotent=True)
+    assert (result.status_code, calls) == (200, 3)
+    result, calls = run([503, 503, 503, 503, 200], idempotent=True)
+    assert (result.status_code, calls) == (503, 4)